@@ -0,0 +1,138 @@
+"""Сборка статики: имена с хешем содержимого, заранее сжатые .gz/.br копии
+и manifest.json, по которому asset_url() подставляет хешированные пути.
+
+    python assets.py            # собрать static/dist
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = Path("static")
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_PATH = DIST_DIR / "manifest.json"
+STATIC_URL = "/static/"
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".xml"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_manifest: Dict[str, str] = {}
+
+
+def fingerprint(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def build(static_dir: Path = STATIC_DIR, dist_dir: Path = DIST_DIR) -> Dict[str, str]:
+    """Собирает dist; уже существующие хешированные файлы не пересобираются."""
+    manifest = {}
+    dist_dir.mkdir(parents=True, exist_ok=True)
+
+    for source in sorted(static_dir.rglob("*")):
+        if not source.is_file() or dist_dir in source.parents:
+            continue
+
+        relative = source.relative_to(static_dir).as_posix()
+        hashed = f"{source.stem}.{fingerprint(source)}{source.suffix}"
+        target = dist_dir / source.parent.relative_to(static_dir) / hashed
+        manifest[relative] = target.relative_to(static_dir).as_posix()
+
+        if target.exists():
+            continue
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source, target)
+
+        if source.suffix in COMPRESSIBLE:
+            data = source.read_bytes()
+            Path(f"{target}.gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                Path(f"{target}.br").write_bytes(brotli.compress(data, quality=11))
+
+    tmp = dist_dir / "manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, dist_dir / "manifest.json")
+    return manifest
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> Dict[str, str]:
+    global _manifest
+    try:
+        _manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        _manifest = {}
+    return _manifest
+
+
+def asset_url(path: Optional[str]) -> Optional[str]:
+    """URL статики с хешем; без сборки или для неизвестного файла — обычный путь."""
+    if not path or path.startswith(("http://", "https://")):
+        return path
+    relative = path[len(STATIC_URL):] if path.startswith(STATIC_URL) else path.lstrip("/")
+    if relative.startswith("static/"):
+        relative = relative[len("static/"):]
+    return STATIC_URL + quote(_manifest.get(relative, relative))
+
+
+class AssetStaticFiles(StaticFiles):
+    """StaticFiles, который для хешированных файлов отдаёт заранее сжатую
+    копию по Accept-Encoding и ставит immutable-кэширование."""
+
+    async def get_response(self, path: str, scope) -> Response:
+        if not path.startswith("dist/"):
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        accepted = request_headers.get("accept-encoding", "")
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = self.lookup_path(path + suffix)
+            if stat_result is None:
+                continue
+            response = FileResponse(
+                full_path,
+                stat_result=stat_result,
+                media_type=media_type,
+                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding", "Cache-Control": IMMUTABLE}
+            )
+            break
+        else:
+            response = await super().get_response(path, scope)
+            if response.status_code != 200:
+                return response
+            response.headers["Cache-Control"] = IMMUTABLE
+            if Path(path).suffix in COMPRESSIBLE:
+                response.headers["Vary"] = "Accept-Encoding"
+            return response
+
+        if self.is_not_modified(response.headers, request_headers):
+            return Response(status_code=304, headers={
+                key: value for key, value in response.headers.items()
+                if key in ("etag", "cache-control", "vary")
+            })
+        return response
+
+
+if __name__ == "__main__":
+    result = build()
+    print(f"✅ Собрано файлов: {len(result)} -> {DIST_DIR}")
@@ -0,0 +1,121 @@
+"""Сравнение корзины: синхронный Session прямо в event loop против AsyncSession.
+
+Чего ждать: AsyncSession проигрывает в пропускной способности одного процесса
+(в этом замере в 1,5–2 раза). aiosqlite выполняет каждый вызов драйвера в
+своём потоке: cursor, execute, fetchall и close — это отдельные переходы
+между потоками, около 13 на одно добавление в корзину. Зато event loop
+больше не стоит на запросах к SQLite: у синхронного пути задержка цикла
+p99 — сотни миллисекунд (страницы, статика, SSE и /metrics ждут, пока
+закончится чужой коммит), у AsyncSession — единицы. Пропускная способность
+добирается воркерами serve.py, а задержку цикла воркерами не исправить.
+
+Оба пути используют профиль движков приложения (database.build_engines:
+WAL, busy_timeout, пул), обработчик повторяет POST /shop/api/cart/add.
+
+Запуск из корня проекта:
+    python -m benchmarks.async_db --requests 400 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# движки строятся с профилем приложения, счётчики метрик в замер не входят
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database import build_engines
+from models import Base, Product
+from shop.cart_logic import CartManager, AsyncCartManager
+
+
+def prepare_db(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(
+            Product(name=f"Product {i}", category="bench", price=10.0 + i, stock=10**9)
+            for i in range(8)
+        )
+        db.commit()
+    engine.dispose()
+
+
+async def loop_lag_probe(stop: asyncio.Event, samples: list):
+    """Измеряет, насколько event loop опаздывает с пробуждением."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        samples.append(time.perf_counter() - started - 0.001)
+
+
+async def run_scenario(name: str, handler, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    lag = []
+    probe = asyncio.create_task(loop_lag_probe(stop, lag))
+
+    async def one(i: int):
+        async with semaphore:
+            await handler(f"bench-{i % concurrency}", i % 8 + 1)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    lag.sort()
+    result = {
+        "rps": total / elapsed,
+        "lag_p99_ms": lag[int(len(lag) * 0.99)] * 1000 if lag else 0,
+        "lag_max_ms": max(lag, default=0) * 1000
+    }
+    print(
+        f"{name:<14} {result['rps']:8.1f} req/s   "
+        f"loop lag p99 {result['lag_p99_ms']:7.2f} ms   "
+        f"max {result['lag_max_ms']:7.2f} ms"
+    )
+    return result
+
+
+async def main(total: int, concurrency: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        prepare_db(path)
+
+        sync_engine, async_engine, _ = build_engines(f"sqlite:///{path}")
+        SyncSession = sessionmaker(bind=sync_engine, autoflush=False)
+        AsyncSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+        async def sync_handler(session_id: str, product_id: int):
+            # так обработчики работали раньше: блокирующий Session прямо в корутине
+            with SyncSession() as db:
+                CartManager(db).add_to_cart(session_id, product_id)
+
+        async def async_handler(session_id: str, product_id: int):
+            async with AsyncSession() as db:
+                await AsyncCartManager(db).add_to_cart(session_id, product_id)
+
+        print(f"{total} requests, concurrency {concurrency}")
+        blocking = await run_scenario("sync Session", sync_handler, total, concurrency)
+        non_blocking = await run_scenario("AsyncSession", async_handler, total, concurrency)
+        print(
+            f"\nAsyncSession: {non_blocking['rps'] / blocking['rps']:.2f}x throughput, "
+            f"loop lag p99 {blocking['lag_p99_ms']:.1f} ms -> {non_blocking['lag_p99_ms']:.1f} ms"
+        )
+
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,71 @@
+"""Сотни одновременных оформлений заказа на один товар: остаток не должен уйти в минус.
+
+Запуск из корня проекта:
+    python -m benchmarks.checkout_contention --buyers 300 --stock 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from models import Base, Cart, CartItem, OrderItem, Product
+from shop.order_logic import AsyncOrderManager
+
+
+def prepare_db(path: str, buyers: int, stock: int):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(Product(id=1, name='"Zeit" Limited Vinyl', category="music", price=30.0, stock=stock))
+        db.add_all(Cart(id=f"buyer-{i}") for i in range(buyers))
+        db.add_all(CartItem(cart_id=f"buyer-{i}", product_id=1, quantity=1 + i % 2) for i in range(buyers))
+        db.commit()
+    engine.dispose()
+
+
+async def main(buyers: int, stock: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "contention.db")
+        prepare_db(path, buyers, stock)
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=buyers, max_overflow=0)
+        Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+        async def checkout(i: int):
+            async with Session() as db:
+                return await AsyncOrderManager(db).create_order(f"buyer-{i}", "Fan", "fan@example.com", "0")
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(checkout(i) for i in range(buyers)), return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+        async with Session() as db:
+            left = await db.scalar(select(Product.stock).where(Product.id == 1))
+            sold = await db.scalar(select(func.coalesce(func.sum(OrderItem.quantity), 0)))
+            carts_left = await db.scalar(select(func.count()).select_from(CartItem))
+        await engine.dispose()
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    succeeded = sum(1 for r in results if isinstance(r, dict) and r["success"])
+    rejected = sum(1 for r in results if isinstance(r, dict) and not r["success"])
+
+    print(f"{buyers} buyers in {elapsed:.2f}s: {succeeded} orders, {rejected} rejected, {len(errors)} errors")
+    print(f"stock {stock} -> {left}, units sold {sold}, carts still filled {carts_left}")
+    for error in errors[:3]:
+        print(f"  {type(error).__name__}: {error}")
+
+    return not errors and left >= 0 and left + sold == stock and carts_left == rejected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buyers", type=int, default=300)
+    parser.add_argument("--stock", type=int, default=50)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(main(args.buyers, args.stock)) else 1)
@@ -0,0 +1,115 @@
+"""Проверка повторов с Idempotency-Key на добавлении в корзину.
+
+Браузер кодирует FormData заново на каждую отправку, и у multipart каждый
+раз новая граница. Скрипт шлёт один и тот же товар с одним ключом несколько
+раз, меняя границу и кодировку формы, и проверяет, что повторы получают
+сохранённый ответ, товар в корзине один, а первый запрос записал в БД
+двумя транзакциями (сама операция вместе с ключом и сохранённый ответ).
+Тот же ключ с другими полями формы — 422. Любое расхождение — код выхода 1.
+
+Запуск из корня проекта (нужен httpx: pip install -r requirements-bench.txt):
+    python -m benchmarks.idempotency_check
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+
+_tmp = tempfile.TemporaryDirectory(prefix="shop-idempotency-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'idempotency.db')}"
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("OUTBOX_ENABLED", "0")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+import httpx
+from sqlalchemy import event
+
+import database
+from config import config
+from main import app
+
+PATH = "/shop/api/cart/add"
+
+
+def multipart(fields: dict) -> tuple:
+    boundary = f"----shop{uuid.uuid4().hex}"
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        for name, value in fields.items()
+    ]
+    body = "".join(parts) + f"--{boundary}--\r\n"
+    return body.encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def count_commits(engine, counter: list):
+    def on_commit(conn):
+        counter[0] += 1
+
+    event.listen(engine, "commit", on_commit)
+    return lambda: event.remove(engine, "commit", on_commit)
+
+
+async def check() -> list:
+    failures = []
+    key = uuid.uuid4().hex
+    fields = {"product_id": "1", "quantity": "1"}
+    commits = [0]
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://shop") as client:
+        client.cookies.set(config.SESSION_COOKIE_NAME, f"idempotency-{key}")
+
+        async def post(body: bytes, content_type: str) -> httpx.Response:
+            return await client.post(PATH, content=body, headers={
+                "content-type": content_type, "idempotency-key": key
+            })
+
+        stop = count_commits(database.async_engine.sync_engine, commits)
+        try:
+            first = await post(*multipart(fields))
+        finally:
+            stop()
+        print(f"Первый запрос: {first.status_code}, коммитов записи: {commits[0]}")
+        if first.status_code != 200:
+            failures.append(f"первый запрос вернул {first.status_code}: {first.text}")
+        if commits[0] != 2:
+            failures.append(f"первый запрос записал {commits[0]} транзакциями вместо 2")
+
+        retries = [
+            ("multipart, новая граница", multipart(fields)),
+            ("multipart, поля в другом порядке", multipart(dict(reversed(list(fields.items()))))),
+            ("urlencoded", ("product_id=1&quantity=1".encode(), "application/x-www-form-urlencoded")),
+        ]
+        for label, (body, content_type) in retries:
+            retry = await post(body, content_type)
+            replayed = retry.headers.get("idempotent-replayed") == "true"
+            print(f"Повтор ({label}): {retry.status_code}, replayed={replayed}")
+            if retry.status_code != first.status_code or not replayed or retry.content != first.content:
+                failures.append(f"повтор ({label}) не получил сохранённый ответ: {retry.status_code} {retry.text}")
+
+        other = await post(*multipart({"product_id": "2", "quantity": "1"}))
+        print(f"Тот же ключ, другой товар: {other.status_code}")
+        if other.status_code != 422:
+            failures.append(f"другие поля с тем же ключом вернули {other.status_code} вместо 422")
+
+        cart = (await client.get("/shop/api/cart")).json()
+        quantities = [item["quantity"] for item in cart["items"]]
+        print(f"В корзине: {quantities}")
+        if quantities != [1]:
+            failures.append(f"в корзине {quantities} вместо [1]")
+
+    return failures
+
+
+def main() -> int:
+    database.init_db()
+    failures = asyncio.run(check())
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Повторы с Idempotency-Key выполнены один раз")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""Нагрузочный прогон сценариев магазина против настоящего приложения из main.py
+на одноразовой SQLite: пропускная способность, p50/p95/p99 и SQL на запрос.
+
+Запуск из корня проекта (нужен httpx: pip install -r requirements-bench.txt):
+    python -m benchmarks.load_test --requests 500 --concurrency 20
+    python -m benchmarks.load_test --transport socket --scenarios browse cart_poll
+    python -m benchmarks.load_test --output before.json
+    python -m benchmarks.load_test --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# приложение читает настройки при импорте, поэтому БД и лимиты задаются до него
+_tmp = tempfile.TemporaryDirectory(prefix="shop-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("WAITING_ROOM_ENABLED", "0")
+
+import httpx
+from sqlalchemy import event, update
+
+import database
+from main import app
+from models import Product
+
+PRODUCTS = 6
+
+
+class SqlCounter:
+    """Считает SQL-запросы всех движков приложения."""
+
+    def __init__(self):
+        self.count = 0
+        engines = {database.engine, database.async_engine.sync_engine, database.async_read_engine.sync_engine}
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    async def request(self, client: httpx.AsyncClient, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+
+async def browse(client, user: int, i: int, rec: Recorder):
+    await rec.request(client, "GET", "/shop/merchandise")
+
+
+async def cart_poll(client, user: int, i: int, rec: Recorder):
+    await rec.request(client, "GET", "/shop/api/cart")
+
+
+async def add_to_cart(client, user: int, i: int, rec: Recorder):
+    await rec.request(client, "POST", "/shop/api/cart/add", data={"product_id": i % PRODUCTS + 1})
+
+
+async def checkout(client, user: int, i: int, rec: Recorder):
+    # полный путь покупателя: положить товар и оформить заказ
+    await rec.request(client, "POST", "/shop/api/cart/add", data={"product_id": i % PRODUCTS + 1})
+    await rec.request(client, "POST", "/shop/api/order/create",
+                      data={"name": "Bench Fan", "email": "bench@example.com", "phone": "0"})
+
+
+SCENARIOS = {
+    "browse": browse,
+    "cart_poll": cart_poll,
+    "add_to_cart": add_to_cart,
+    "checkout": checkout,
+}
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def prime_users(clients):
+    """У каждого виртуального покупателя в корзине уже что-то лежит."""
+    for user, client in enumerate(clients):
+        await client.post("/shop/api/cart/add", data={"product_id": user % PRODUCTS + 1})
+
+
+async def run_scenario(name: str, clients, total: int, warmup: int, counter: SqlCounter) -> dict:
+    step = SCENARIOS[name]
+
+    async def drive(iterations: int, rec: Recorder):
+        queue = iter(range(iterations))
+
+        async def user_loop(user: int, client):
+            for i in queue:
+                await step(client, user, i, rec)
+
+        await asyncio.gather(*(user_loop(user, client) for user, client in enumerate(clients)))
+
+    await drive(warmup, Recorder())
+
+    rec = Recorder()
+    statements = counter.count
+    started = time.perf_counter()
+    await drive(total, rec)
+    elapsed = time.perf_counter() - started
+    statements = counter.count - statements
+
+    latencies = sorted(rec.latencies)
+    requests = len(latencies)
+    return {
+        "requests": requests,
+        "errors": rec.errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0,
+        "sql_per_request": round(statements / requests, 2) if requests else 0,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def restock():
+    # сценарии не должны упираться в остатки из сидов
+    with database.engine.begin() as conn:
+        conn.execute(update(Product).values(stock=10**9))
+
+
+async def run_all(args) -> dict:
+    counter = SqlCounter()
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    if args.transport == "socket":
+        import uvicorn
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        base_url = f"http://127.0.0.1:{port}"
+        transport = httpx.AsyncHTTPTransport(limits=limits)
+        lifespan = None
+    else:
+        base_url = "http://bench"
+        transport = httpx.ASGITransport(app=app)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+
+    restock()
+    clients = [
+        httpx.AsyncClient(transport=transport, base_url=base_url, cookies={"session_id": f"bench-user-{user}"})
+        for user in range(args.concurrency)
+    ]
+
+    results = {}
+    try:
+        await prime_users(clients)
+        for name in args.scenarios:
+            results[name] = await run_scenario(name, clients, args.requests, args.warmup, counter)
+            print_row(name, results[name])
+    finally:
+        for client in clients:
+            await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        else:
+            server.should_exit = True
+            await serving
+
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "python": sys.version.split()[0],
+        "transport": args.transport,
+        "concurrency": args.concurrency,
+        "iterations": args.requests,
+        "scenarios": results,
+    }
+
+
+def print_row(name: str, r: dict):
+    print(
+        f"{name:<12} {r['rps']:8.1f} req/s   p50 {r['p50_ms']:7.2f}   p95 {r['p95_ms']:7.2f}   "
+        f"p99 {r['p99_ms']:7.2f} ms   sql/req {r['sql_per_request']:5.2f}   errors {r['errors']}"
+    )
+
+
+def compare(report: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nсравнение с {baseline_path} ({baseline.get('commit') or '?'} -> {report['commit'] or '?'})")
+    for name, current in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        deltas = []
+        for key in ("rps", "p95_ms", "p99_ms", "sql_per_request"):
+            if before[key]:
+                deltas.append(f"{key} {(current[key] - before[key]) / before[key] * 100:+6.1f}%")
+        print(f"{name:<12} " + "   ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", choices=("asgi", "socket"), default="asgi")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="итераций на сценарий")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    print(f"{args.transport}, {args.requests} iterations per scenario, concurrency {args.concurrency}")
+    try:
+        report = asyncio.run(run_all(args))
+    finally:
+        _tmp.cleanup()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ Результаты сохранены в {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
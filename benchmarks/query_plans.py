@@ -0,0 +1,102 @@
+"""Проверка планов запросов корзины и оформления заказа.
+
+Прогоняет операции CartManager, OrderManager и чистку корзин на одноразовой
+SQLite со схемой после migrations.py, записывает каждый выполненный SQL и
+для каждого различного запроса смотрит EXPLAIN QUERY PLAN. Полный проход по
+таблице (SCAN <таблица> без индекса) — ошибка, скрипт выходит с кодом 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.query_plans
+    python -m benchmarks.query_plans --verbose
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+_tmp = tempfile.TemporaryDirectory(prefix="shop-plans-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'plans.db')}"
+
+from sqlalchemy import event
+
+import database
+from shop.cart_logic import CartManager
+from shop.maintenance import CartSweeper
+from shop.order_logic import OrderManager
+
+SESSION = "plans-session"
+# SCAN по таблице без индекса; SCAN CONSTANT ROW и подзапросы — не таблицы
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)(?!.*\bUSING\b.*\bINDEX\b)")
+
+
+def capture(engine, statements: dict):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0]
+        if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+            statements.setdefault(statement, parameters)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return lambda: event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def exercise():
+    db = database.SessionLocal()
+    try:
+        carts = CartManager(db)
+        added = carts.add_to_cart(SESSION, 1, 1)
+        carts.add_to_cart(SESSION, 1, 1)
+        item_id = added["cart_item_id"]
+        carts.update_cart_item(SESSION, item_id, 2)
+        carts.apply_batch(SESSION, [
+            {"op": "add", "product_id": 2, "quantity": 1},
+            {"op": "update", "item_id": item_id, "quantity": 1}
+        ])
+        carts.get_cart_details(SESSION)
+        carts.get_cart_summary(SESSION)
+        second = carts.add_to_cart(SESSION, 3, 1)
+        carts.remove_from_cart(SESSION, second["cart_item_id"])
+
+        order = OrderManager(db).create_order(SESSION, "Plan Check", "plans@example.com", "+000")
+        if not order["success"]:
+            raise RuntimeError(f"Заказ не оформлен: {order['error']}")
+
+        carts.add_to_cart(SESSION, 2, 1)
+        carts.clear_cart(SESSION)
+        CartSweeper(db).sweep_batch(datetime.utcnow() - timedelta(days=30), 100)
+    finally:
+        db.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN для запросов корзины и заказов")
+    parser.add_argument("--verbose", action="store_true", help="печатать планы всех запросов")
+    args = parser.parse_args()
+
+    database.init_db()
+    statements = {}
+    stop = capture(database.engine, statements)
+    try:
+        exercise()
+    finally:
+        stop()
+
+    failures = 0
+    with database.engine.connect() as connection:
+        for statement, parameters in statements.items():
+            plan = [row[3] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            scans = [line for line in plan if FULL_SCAN.match(line)]
+            failures += bool(scans)
+            if scans or args.verbose:
+                print(f"{'❌' if scans else '✅'} {' '.join(statement.split())[:160]}")
+                for line in plan:
+                    print(f"      {line}")
+
+    print(f"\nПроверено запросов: {len(statements)}, с полным проходом по таблице: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
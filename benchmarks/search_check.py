@@ -0,0 +1,93 @@
+"""Проверка постраничного поиска товаров по курсору.
+
+Проходит каталог страницами /shop/api/products/search при каждой сортировке
+и проверяет, что товары не повторяются и не теряются. Затем шлёт испорченные
+и подделанные курсоры (не base64, не JSON, объект или список вместо значения
+ключа, нецелый id) — на каждый ожидается 400 Invalid cursor, а не 500.
+Любое расхождение — код выхода 1.
+
+Запуск из корня проекта (нужен httpx: pip install -r requirements-bench.txt):
+    python -m benchmarks.search_check
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory(prefix="shop-search-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'search.db')}"
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("OUTBOX_ENABLED", "0")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+import httpx
+
+import database
+from main import app
+
+PATH = "/shop/api/products/search"
+SORTS = ("relevance", "price_asc", "price_desc", "name")
+
+
+def forged(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+MALFORMED_CURSORS = {
+    "не base64": "!!!",
+    "не JSON": base64.urlsafe_b64encode(b"not json").decode(),
+    "один элемент": forged([1]),
+    "три элемента": forged([1, 2, 3]),
+    "объект вместо значения": forged([{"a": 1}, 1]),
+    "список вместо значения": forged([[1, 2], 1]),
+    "строка вместо id": forged([10.0, "1"]),
+    "дробный id": forged([10.0, 1.5]),
+}
+
+
+async def check() -> list:
+    failures = []
+    # ошибка приложения должна стать ответом 500, а не исключением в скрипте
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://shop") as client:
+        for sort in SORTS:
+            first = (await client.get(PATH, params={"sort": sort, "limit": 100})).json()
+            seen, after = [], None
+            while True:
+                params = {"sort": sort, "limit": 2, **({"after": after} if after else {})}
+                response = await client.get(PATH, params=params)
+                if response.status_code != 200:
+                    failures.append(f"sort={sort}: страница вернула {response.status_code}: {response.text}")
+                    break
+                page = response.json()
+                seen += [item["id"] for item in page["items"]]
+                after = page["next_cursor"]
+                if not after:
+                    break
+            expected = [item["id"] for item in first["items"]]
+            print(f"sort={sort}: товаров {len(seen)} из {first['total']}")
+            if seen != expected:
+                failures.append(f"sort={sort}: страницы дали {seen} вместо {expected}")
+
+        for label, cursor in MALFORMED_CURSORS.items():
+            response = await client.get(PATH, params={"after": cursor})
+            print(f"Курсор ({label}): {response.status_code}")
+            if response.status_code != 400:
+                failures.append(f"курсор ({label}) вернул {response.status_code} вместо 400")
+    return failures
+
+
+def main() -> int:
+    database.init_db()
+    failures = asyncio.run(check())
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Курсоры поиска товаров проверены")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
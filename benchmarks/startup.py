@@ -0,0 +1,139 @@
+"""Холодный старт воркера: импорт приложения, lifespan и первый запрос,
+с пустым и с заполненным bytecode-кэшем шаблонов, плюс разбор -X importtime.
+
+Запуск из корня проекта (нужен httpx: pip install -r requirements-bench.txt):
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --imports 25 --output startup.json
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# выполняется в отдельном процессе, чтобы каждый замер начинался с чистого интерпретатора
+PROBE = r"""
+import asyncio, json, time
+started = time.perf_counter()
+import httpx
+from main import app
+imported = time.perf_counter()
+
+async def run():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            first = {}
+            for path in ("/shop/merchandise", "/shop/cart", "/history"):
+                t = time.perf_counter()
+                response = await client.get(path)
+                assert response.status_code == 200, path
+                first[path] = round((time.perf_counter() - t) * 1000, 2)
+    return ready, first
+
+ready, first = asyncio.run(run())
+print(json.dumps({
+    "import_ms": round((imported - started) * 1000, 1),
+    "lifespan_ms": round((ready - imported) * 1000, 1),
+    "first_request_ms": first
+}))
+"""
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run_python(code: str, env: dict, *flags) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+
+
+def probe(env: dict) -> dict:
+    output = run_python(PROBE, env).stdout.strip().splitlines()
+    return json.loads(output[-1])
+
+
+def import_audit(env: dict, top: int) -> list:
+    stderr = run_python("import main", env, "-X", "importtime").stderr
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.search(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": (len(indent) - 1) // 2
+            })
+    # то, что main импортирует напрямую: по этому уровню видно, какая зависимость дорогая
+    return sorted((m for m in modules if m["depth"] == 1), key=lambda m: -m["cumulative_ms"])[:top]
+
+
+def summarize(samples: list) -> dict:
+    def median(values):
+        return round(statistics.median(values), 2)
+
+    return {
+        "import_ms": median([s["import_ms"] for s in samples]),
+        "lifespan_ms": median([s["lifespan_ms"] for s in samples]),
+        "first_request_ms": {
+            path: median([s["first_request_ms"][path] for s in samples])
+            for path in samples[0]["first_request_ms"]
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--imports", type=int, default=15, help="сколько самых дорогих импортов показать")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="shop-startup-") as tmp:
+        cache_dir = os.path.join(tmp, "jinja")
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.getcwd(),
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+            "TEMPLATE_CACHE_DIR": cache_dir,
+            "RATE_LIMIT_ENABLED": "0",
+            "PAGE_CACHE_ENABLED": "0",
+        }
+        # как в serve.py: база и статика готовятся один раз, воркеры их только используют
+        run_python("from database import init_db; init_db()\nfrom assets import build; build()", env)
+        worker_env = {**env, "BOOTSTRAP_ON_STARTUP": "0", "ASSETS_BUILD_ON_STARTUP": "0"}
+
+        cold = []
+        for _ in range(args.runs):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cold.append(probe(worker_env))
+        warm = [probe(worker_env) for _ in range(args.runs)]
+        imports = import_audit(worker_env, args.imports)
+
+    report = {"runs": args.runs, "cold_template_cache": summarize(cold), "warm_template_cache": summarize(warm),
+              "imports": imports}
+
+    for label in ("cold_template_cache", "warm_template_cache"):
+        r = report[label]
+        first = ", ".join(f"{path} {ms:.1f}" for path, ms in r["first_request_ms"].items())
+        print(f"{label:<20} import {r['import_ms']:7.1f} ms   lifespan {r['lifespan_ms']:7.1f} ms   "
+              f"first requests (ms): {first}")
+
+    print("\nсамые дорогие импорты из main (cumulative):")
+    for m in imports:
+        print(f"  {m['cumulative_ms']:8.1f} ms  {m['module']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
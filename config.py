@@ -5,11 +5,95 @@ load_dotenv()
 
 class Config:
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./rammstein_shop.db")
+    # отдельный пул только для чтения каталога: реплика сервера БД,
+    # или для SQLite — то же файл в режиме mode=ro
+    DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+    DB_READONLY_POOL = os.getenv("DB_READONLY_POOL", "1") == "1"
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    ASSETS_BUILD_ON_STARTUP = os.getenv("ASSETS_BUILD_ON_STARTUP", "1") == "1"
+    TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", ".cache/jinja")
+    # в продакшене шаблоны меняются только с деплоем: serve.py выключает проверку mtime
+    TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "1") == "1"
+    PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1") == "1"
+    PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "300"))
     SESSION_COOKIE_NAME = "session_id"
     SESSION_MAX_AGE = 60 * 60 * 24 * 7 
     SHOP_NAME = "Rammstein Fan Shop"
     CURRENCY = "€"
     FREE_SHIPPING_THRESHOLD = 100.00
     SHIPPING_COST = 9.99
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+    RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "5"))
+    RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+    # режим очереди для дропов: включается на время старта продаж
+    WAITING_ROOM_ENABLED = os.getenv("WAITING_ROOM_ENABLED", "0") == "1"
+    WAITING_ROOM_ADMIT_PER_SECOND = float(os.getenv("WAITING_ROOM_ADMIT_PER_SECOND", "10"))
+    WAITING_ROOM_PASS_MINUTES = int(os.getenv("WAITING_ROOM_PASS_MINUTES", "15"))
+    WAITING_ROOM_PATHS = ("/shop/api/cart/add", "/shop/api/order/create", "/shop/api/tickets/hold")
+    ADMISSION_SECRET = os.getenv("ADMISSION_SECRET", "")
+    ADMISSION_COOKIE_NAME = "admission_pass"
+    QUEUE_COOKIE_NAME = "queue_ticket"
+    TICKET_HOLD_MINUTES = int(os.getenv("TICKET_HOLD_MINUTES", "10"))
+    TICKET_MAX_PER_HOLD = int(os.getenv("TICKET_MAX_PER_HOLD", "10"))
+    TICKET_HOLD_SWEEP_SECONDS = int(os.getenv("TICKET_HOLD_SWEEP_SECONDS", "15"))
+    TICKET_HOLD_SWEEP_BATCH = int(os.getenv("TICKET_HOLD_SWEEP_BATCH", "500"))
+    CART_SWEEP_INTERVAL_SECONDS = int(os.getenv("CART_SWEEP_INTERVAL_SECONDS", "3600"))
+    CART_SWEEP_BATCH = int(os.getenv("CART_SWEEP_BATCH", "500"))
+    CART_SWEEP_PAUSE_SECONDS = float(os.getenv("CART_SWEEP_PAUSE_SECONDS", "0.05"))
+    CART_SWEEP_VACUUM = os.getenv("CART_SWEEP_VACUUM", "1") == "1"
+    # заголовок X-Reports-Token для отчётов по продажам и выгрузки заказов;
+    # пока токен не задан, эти эндпоинты отвечают 403
+    REPORTS_TOKEN = os.getenv("REPORTS_TOKEN", "")
+    # serve.py выполняет init_db и сборку статики один раз до запуска воркеров
+    BOOTSTRAP_ON_STARTUP = os.getenv("BOOTSTRAP_ON_STARTUP", "1") == "1"
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+    GRACEFUL_SHUTDOWN_SECONDS = int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30"))
+    CACHE_SYNC_ENABLED = os.getenv("CACHE_SYNC_ENABLED", "0") == "1"
+    CACHE_SYNC_POLL_SECONDS = float(os.getenv("CACHE_SYNC_POLL_SECONDS", "0.5"))
+    CACHE_EVENTS_TTL_SECONDS = int(os.getenv("CACHE_EVENTS_TTL_SECONDS", "300"))
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "1") == "1"
+    METRICS_SLOW_QUERY_MS = float(os.getenv("METRICS_SLOW_QUERY_MS", "100"))
+    # столько SQL на один HTTP-запрос — повод искать N+1
+    METRICS_REQUEST_QUERY_WARN = int(os.getenv("METRICS_REQUEST_QUERY_WARN", "20"))
+    # письма уходят из очереди outbox_messages фоновым воркером:
+    # smtp://host:port (локально: python -m aiosmtpd -n -l localhost:1025),
+    # file:путь (JSON-строки, только для тестов: файл с адресами и текстами писем
+    # растёт без ротации) или log (печать в консоль). Пока транспорт не задан,
+    # письма копятся в очереди и не отправляются.
+    OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "1") == "1"
+    OUTBOX_TRANSPORT = os.getenv("OUTBOX_TRANSPORT", "")
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "4"))
+    OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+    OUTBOX_SEND_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_SEND_TIMEOUT_SECONDS", "30"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+    OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+    OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "14"))
+    MAIL_FROM = os.getenv("MAIL_FROM", "shop@rammstein-fan.local")
+    CONTACT_INBOX = os.getenv("CONTACT_INBOX", "fans@rammstein-fan.local")
+    # повтор запроса с тем же Idempotency-Key получает сохранённый ответ
+    IDEMPOTENT_PATHS = ("/shop/api/cart/add", "/shop/api/order/create")
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    # сколько повтор ждёт завершения исходного запроса, прежде чем получить 409
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+    # после этого срока незавершённый запрос (упавший воркер) можно выполнить заново
+    IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+    # /shop/api/live: остатки и корзина по SSE вместо перечитывания после каждого действия
+    LIVE_ENABLED = os.getenv("LIVE_ENABLED", "1") == "1"
+    LIVE_COALESCE_MS = int(os.getenv("LIVE_COALESCE_MS", "200"))
+    LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+    LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "10000"))
+    LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "32"))
     
 config = Config()
\ No newline at end of file
@@ -1,14 +1,124 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url, URL
 from sqlalchemy.orm import sessionmaker, Session
-from models import Base, Product
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from models import Base, Product, Concert, Venue, TicketTier, Order, SalesDaily
+from shop.search_logic import create_search_index
+from shop.concert_logic import create_concert_index
+from migrations import migrate
+from config import config
+from metrics import instrument_engine
+from datetime import date
+import importlib
 import random
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./rammstein_shop.db"
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+# корзина, сводки продаж и Idempotency-Key пишутся через INSERT ... ON CONFLICT;
+# у MySQL вместо него ON DUPLICATE KEY UPDATE с другим API, поэтому он не поддерживается
+UPSERT_DIALECTS = {
+    "sqlite": "sqlalchemy.dialects.sqlite",
+    "postgresql": "sqlalchemy.dialects.postgresql",
+}
+_dialect_inserts = {}
+
+def dialect_insert(session, model):
+    """insert() диалекта сессии с on_conflict_do_update. Модуль диалекта
+    загружается при первом обращении: PostgreSQL — это ~40 ms импорта,
+    которые SQLite-установке не нужны."""
+    name = session.get_bind().dialect.name
+    insert = _dialect_inserts.get(name)
+    if insert is None:
+        if name not in UPSERT_DIALECTS:
+            raise NotImplementedError(f"INSERT ... ON CONFLICT is not supported for {name}")
+        insert = _dialect_inserts[name] = importlib.import_module(UPSERT_DIALECTS[name]).insert
+    return insert(model)
+
+def to_async_url(url: URL) -> URL:
+    if url.drivername in ASYNC_DRIVERS.values():
+        return url
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+def is_sqlite_file(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+def sqlite_readonly_url(url: URL) -> URL:
+    return url.set(database=f"file:{url.database}", query={**url.query, "mode": "ro", "uri": "true"})
+
+def engine_options(url: URL) -> dict:
+    options = {"echo": config.DB_ECHO}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False, "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if not is_sqlite_file(url):
+            return options
+    else:
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = config.DB_POOL_RECYCLE
+    options["pool_size"] = config.DB_POOL_SIZE
+    options["max_overflow"] = config.DB_MAX_OVERFLOW
+    options["pool_timeout"] = config.DB_POOL_TIMEOUT
+    return options
+
+def apply_sqlite_pragmas(sync_engine, readonly: bool = False):
+    """Профиль SQLite для продакшена, выставляется на каждом новом соединении."""
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if readonly:
+            cursor.execute("PRAGMA query_only = ON")
+        else:
+            # действует только для новой БД; очистка корзин потом делает incremental_vacuum
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute(f"PRAGMA busy_timeout = {config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA synchronous = {config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = -{config.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size = {config.SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        cursor.close()
+
+def build_engines(database_url: str, read_url: str = ""):
+    url = make_url(database_url)
+    if url.get_backend_name() not in UPSERT_DIALECTS:
+        raise RuntimeError(f"Unsupported database backend: {url.get_backend_name()} "
+                           f"(supported: {', '.join(UPSERT_DIALECTS)})")
+    sync_engine = create_engine(url, **engine_options(url))
+    write_engine = create_async_engine(to_async_url(url), **engine_options(url))
+
+    if read_url:
+        read = make_url(read_url)
+        read_engine = create_async_engine(to_async_url(read), **engine_options(read))
+    elif config.DB_READONLY_POOL and is_sqlite_file(url):
+        read = sqlite_readonly_url(url)
+        read_engine = create_async_engine(to_async_url(read), **engine_options(read))
+    else:
+        read_engine = write_engine
+
+    if url.get_backend_name() == "sqlite":
+        apply_sqlite_pragmas(sync_engine)
+        apply_sqlite_pragmas(write_engine.sync_engine)
+        if read_engine is not write_engine and not read_url:
+            apply_sqlite_pragmas(read_engine.sync_engine, readonly=True)
+
+    if config.METRICS_ENABLED:
+        instrument_engine(sync_engine, "sync")
+        instrument_engine(write_engine.sync_engine, "write")
+        if read_engine is not write_engine:
+            instrument_engine(read_engine.sync_engine, "read")
+
+    return sync_engine, write_engine, read_engine
+
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
+engine, async_engine, async_read_engine = build_engines(
+    SQLALCHEMY_DATABASE_URL, config.DATABASE_READ_URL
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 
 def get_db():
     db = SessionLocal()
@@ -17,8 +127,27 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+async def dispose_engines():
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+    engine.dispose()
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # create_all не трогает существующие таблицы: индексы для них — миграциями
+    migrate(engine)
+    with engine.begin() as connection:
+        create_search_index(connection)
+        create_concert_index(connection)
     
     db = SessionLocal()
     
@@ -86,4 +215,81 @@ def init_db():
         db.commit()
         print("✅ База данных инициализирована с тестовыми товарами")
     
-    db.close()
\ No newline at end of file
+    if db.query(Concert).count() == 0:
+        seed_concerts(db)
+        print("✅ Добавлены концерты тура")
+    
+    if db.query(TicketTier).count() == 0:
+        seed_ticket_tiers(db)
+        print("✅ Добавлены категории билетов")
+    
+    # база с заказами, созданная до появления сводок продаж
+    if db.query(SalesDaily).first() is None and db.query(Order).first() is not None:
+        # sales_logic сам импортирует database (dialect_insert)
+        from shop.sales_logic import SalesRollup
+        result = SalesRollup(db).rebuild()
+        print(f"✅ Сводки продаж пересчитаны: {result['days']} дн.")
+    
+    db.close()
+
+def seed_concerts(db: Session):
+    tour = [
+        ("Stadium Tour 2026", "Olympiastadion Berlin", "Berlin", "Germany", date(2026, 6, 15),
+         "Epic stadium show with full pyrotechnics production", 80.00, True, "SELLING FAST"),
+        ("European Stadium Tour", "Stade de France", "Paris", "France", date(2026, 6, 22),
+         "French leg of the massive stadium tour", 90.00, True, "VIP AVAILABLE"),
+        ("Feuer & Flamme", "Estadio Metropolitano", "Madrid", "Spain", date(2026, 7, 5),
+         "Spanish concert with special guests", 70.00, True, None),
+        ("Zeit Live Experience", "Wembley Stadium", "London", "UK", date(2026, 7, 12),
+         "Special Zeit album performance", 90.00, True, "NEW DATE"),
+        ("Mutter Anniversary Show", "Allianz Arena", "Munich", "Germany", date(2026, 7, 20),
+         "Celebrating 23 years of Mutter album", 100.00, True, None),
+        ("Nordic Fire Tour", "Friends Arena", "Stockholm", "Sweden", date(2026, 8, 2),
+         "Scandinavian exclusive performance", 80.00, True, None),
+        ("Alpine Pyro Spectacle", "Letzigrund Stadium", "Zurich", "Switzerland", date(2026, 8, 15),
+         "Mountain backdrop with enhanced pyro", 110.00, False, "SOLD OUT"),
+        ("Mediterranean Nights", "Stadio Olimpico", "Rome", "Italy", date(2026, 8, 25),
+         "Open air summer concert in Rome", 80.00, True, None),
+        ("Eastern European Tour", "PGE Narodowy", "Warsaw", "Poland", date(2026, 9, 5),
+         "First time in Poland since 2019", 74.00, True, None),
+        ("Benefit Concert for Charity", "Ernst-Happel-Stadion", "Vienna", "Austria", date(2026, 9, 15),
+         "Special charity event with acoustic set", 140.00, True, "CHARITY"),
+    ]
+    
+    for title, venue_name, city, country, concert_date, description, price, available, badge in tour:
+        venue = Venue(name=venue_name, city=city, country=country)
+        db.add(Concert(
+            title=title,
+            venue=venue,
+            date=concert_date,
+            description=description,
+            price=price,
+            image_url=f"/static/img/concerts/{city}, {country} • {venue_name}.png",
+            badge=badge,
+            available=available,
+        ))
+    
+    db.commit()
+
+TICKET_TIERS = [
+    # code, name, price (None = цена концерта), capacity
+    ("general", "General Admission", None, 40000),
+    ("front", "Front Stage", 150.00, 5000),
+    ("seated", "Seated Ticket", 130.00, 20000),
+    ("vip", "VIP Experience", 200.00, 500),
+]
+
+def seed_ticket_tiers(db: Session):
+    for concert in db.query(Concert).all():
+        for code, name, price, capacity in TICKET_TIERS:
+            db.add(TicketTier(
+                concert_id=concert.id,
+                code=code,
+                name=name,
+                price=concert.price if price is None else price,
+                capacity=capacity,
+                sold=0 if concert.available else capacity,
+                held=0,
+            ))
+    
+    db.commit()
\ No newline at end of file
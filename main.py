@@ -1,24 +1,72 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from contextlib import asynccontextmanager
-from database import init_db
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from contextlib import asynccontextmanager, suppress
+import asyncio
+from database import init_db, dispose_engines, AsyncSessionLocal, AsyncReadSessionLocal
 from shop.routes import router as shop_router
+from shop.ticket_logic import hold_expiry_worker
+from shop.maintenance import cart_sweeper_worker
+from shop.cache_sync import cache_sync_worker
+from shop.outbox import outbox_worker
+from shop.catalog_cache import catalog_cache
+from shop.admission import AdmissionControlMiddleware
+from shop.idempotency import IdempotencyMiddleware
+from assets import AssetStaticFiles, build as build_assets, load_manifest
+from templating import precompile as precompile_templates, templates
+from config import config
+from page_cache import PageCacheMiddleware, PageRule
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, render_metrics
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
-    print("✅ Database initialized")
+    if config.BOOTSTRAP_ON_STARTUP:
+        init_db()
+        print("✅ Database initialized")
+        if config.ASSETS_BUILD_ON_STARTUP:
+            build_assets()
+    load_manifest()
+    precompile_templates()
+    # соединение пула чтения и снимок каталога готовятся до первого покупателя
+    async with AsyncReadSessionLocal() as db:
+        await catalog_cache.get(db)
+    workers = [
+        asyncio.create_task(hold_expiry_worker(AsyncSessionLocal)),
+        asyncio.create_task(cart_sweeper_worker(AsyncSessionLocal)),
+    ]
+    if config.CACHE_SYNC_ENABLED:
+        workers.append(asyncio.create_task(cache_sync_worker(AsyncSessionLocal)))
+    if config.OUTBOX_ENABLED:
+        workers.append(asyncio.create_task(outbox_worker(AsyncSessionLocal)))
     yield
+    for worker in workers:
+        worker.cancel()
+        with suppress(asyncio.CancelledError):
+            await worker
+    await dispose_engines()
     print("🛑 Application shutting down")
 
 app = FastAPI(title="Rammstein Fan Site", lifespan=lifespan)
+# внутри AdmissionControl: повторы тоже проходят лимит запросов и очередь
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(PageCacheMiddleware, pages={
+    "/": PageRule("index.html", ttl=config.PAGE_CACHE_TTL, bypass=not config.PAGE_CACHE_ENABLED),
+    "/bandmates": PageRule("bandmates.html", ttl=config.PAGE_CACHE_TTL, bypass=not config.PAGE_CACHE_ENABLED),
+    "/history": PageRule("history.html", ttl=config.PAGE_CACHE_TTL, bypass=not config.PAGE_CACHE_ENABLED),
+    "/tickets": PageRule("tickets.html", ttl=config.PAGE_CACHE_TTL, bypass=not config.PAGE_CACHE_ENABLED),
+    "/contacts": PageRule("contacts.html", ttl=config.PAGE_CACHE_TTL, bypass=not config.PAGE_CACHE_ENABLED),
+})
+if config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, server_timing=config.SERVER_TIMING_ENABLED)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+app.mount("/static", AssetStaticFiles(directory="static"), name="static")
 app.include_router(shop_router)
 
+if config.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/", response_class=HTMLResponse)
 async def home_page(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -0,0 +1,228 @@
+"""Метрики запросов и БД в текстовом формате Prometheus.
+
+MetricsMiddleware считает задержку по маршрутам, запросы в работе и коды
+ответов; instrument_engine() вешает на движок SQLAlchemy счётчик запросов
+и времени в БД — в целом и отдельно для текущего HTTP-запроса. Итог по
+запросу уходит в заголовок Server-Timing, медленные SQL пишутся в лог."""
+import contextvars
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+from config import config
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), value: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def samples(self):
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {value:g}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple = (), value: float = 1):
+        self.inc(labels, -value)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, labels: Tuple, value: float):
+        # [счётчики по корзинам..., сумма, количество]
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def samples(self):
+        for labels, entry in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, entry):
+                le = 'le="%g"' % bound
+                yield f"{self.name}_bucket{_labels(self.labels, labels, le)} {count}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labels, labels, le)} {entry[-1]}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {entry[-2]:.6f}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {entry[-1]}"
+
+
+HTTP_REQUESTS = Counter(
+    "shop_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+HTTP_LATENCY = Histogram(
+    "shop_http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+HTTP_IN_FLIGHT = Gauge(
+    "shop_http_requests_in_flight", "HTTP requests being processed", ("method",)
+)
+HTTP_QUERIES = Histogram(
+    "shop_http_request_db_queries", "SQL statements per HTTP request", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS
+)
+DB_QUERIES = Counter("shop_db_queries_total", "SQL statements executed", ("engine",))
+DB_LATENCY = Histogram("shop_db_query_duration_seconds", "SQL statement latency", ("engine",))
+DB_SLOW_QUERIES = Counter("shop_db_slow_queries_total", "SQL statements over the slow threshold", ("engine",))
+OUTBOX_DELIVERIES = Counter(
+    "shop_outbox_deliveries_total", "Outbox delivery attempts by message kind and result", ("kind", "result")
+)
+OUTBOX_LATENCY = Histogram("shop_outbox_send_duration_seconds", "Outbox transport send latency", ("kind",))
+LIVE_SUBSCRIBERS = Gauge("shop_live_subscribers", "Open /shop/api/live event streams")
+
+REGISTRY = (HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT, HTTP_QUERIES, DB_QUERIES, DB_LATENCY, DB_SLOW_QUERIES,
+            OUTBOX_DELIVERIES, OUTBOX_LATENCY, LIVE_SUBSCRIBERS)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+@dataclass
+class RequestStats:
+    method: str
+    path: str
+    queries: int = 0
+    db_seconds: float = 0.0
+
+    def server_timing(self, total: float) -> str:
+        return (f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries", '
+                f"app;dur={(total - self.db_seconds) * 1000:.1f}, "
+                f"total;dur={total * 1000:.1f}")
+
+
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+
+def instrument_engine(sync_engine, name: str):
+    """Считает запросы и время в БД; для async-движка передаётся его sync_engine."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERIES.inc((name,))
+        DB_LATENCY.observe((name,), elapsed)
+
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+        if elapsed * 1000 >= config.METRICS_SLOW_QUERY_MS:
+            DB_SLOW_QUERIES.inc((name,))
+            where = f"{stats.method} {stats.path}" if stats else "вне запроса"
+            print(f"🐢 Медленный SQL {elapsed * 1000:.1f} ms [{where}]: {' '.join(statement.split())[:300]}")
+
+    @event.listens_for(sync_engine, "handle_error")
+    def on_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+class MetricsMiddleware:
+    """Самый внешний middleware: видит и ответы очереди, и страницы из кэша."""
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        root_path = scope.get("root_path", "")
+        stats = RequestStats(method, scope["path"])
+        token = current_request.set(stats)
+        response = {"status": 500, "by_path": False}
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc((method,))
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                headers = message.get("headers", [])
+                # ответ из кэша страниц или повтор по Idempotency-Key: роутер не вызывался
+                response["by_path"] = any(name in (b"x-page-cache", b"idempotent-replayed") for name, _ in headers)
+                if self.server_timing:
+                    timing = stats.server_timing(time.perf_counter() - started)
+                    message = {**message, "headers": [*headers, (b"server-timing", timing.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            HTTP_IN_FLIGHT.dec((method,))
+
+            route = self._route(scope, root_path, response["by_path"])
+            HTTP_REQUESTS.inc((method, route, str(response["status"])))
+            HTTP_LATENCY.observe((method, route), elapsed)
+            HTTP_QUERIES.observe((method, route), stats.queries)
+
+            if stats.queries >= config.METRICS_REQUEST_QUERY_WARN:
+                print(f"⚠️ {stats.queries} SQL-запросов за один запрос {method} {route} — похоже на N+1")
+
+    @staticmethod
+    def _route(scope, root_path: str, by_path: bool) -> str:
+        # шаблон маршрута, а не сырой путь, чтобы id не плодили ряды метрик
+        route = scope.get("route")
+        if route is not None:
+            return getattr(route, "path", "unmatched")
+        if scope.get("root_path", "") != root_path:
+            # смонтированное приложение (статика) — по префиксу монтирования
+            return scope["root_path"][len(root_path):]
+        if by_path:
+            return scope["path"]
+        return "unmatched"
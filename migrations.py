@@ -0,0 +1,149 @@
+"""Версионные миграции схемы.
+
+create_all создаёт только отсутствующие таблицы и не меняет существующие,
+поэтому индексы, ограничения и перенос данных для уже работающей БД делаются
+здесь: каждая миграция выполняется один раз, номер записывается в
+schema_migrations. Шаги миграции пишутся повторяемыми (индекс — если его
+ещё нет): драйвер SQLite выполняет DDL вне транзакции, и прерванная миграция
+просто повторится целиком. init_db применяет новые миграции при старте, вручную:
+
+    python migrations.py            # применить новые
+    python migrations.py status     # что применено, что ждёт
+"""
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from sqlalchemy import Index, insert, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from models import Base, Cart, CartItem, Order, OrderItem, Product, SchemaMigration, Venue
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    def register(apply: Callable[[Connection], None]):
+        MIGRATIONS.append(Migration(version, description, apply))
+        return apply
+    return register
+
+
+def create_index(connection: Connection, index: Index):
+    """CREATE INDEX, если его ещё нет. В SQLite индекс строится за один проход
+    по таблице под блокировкой записи, чтение (WAL) при этом не ждёт."""
+    existing = {ix["name"] for ix in inspect(connection).get_indexes(index.table.name)}
+    if index.name not in existing:
+        index.create(bind=connection)
+
+
+def drop_index(connection: Connection, name: str):
+    connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def table_index(table, name: str) -> Index:
+    return next(index for index in table.indexes if index.name == name)
+
+
+@migration(1, "cart and order indexes used by cart upsert, cart sweep and sales rollups")
+def cart_and_order_indexes(connection: Connection):
+    # уникальный индекс не построится, пока в корзине есть дубли товара:
+    # складываем количество в первую позицию и удаляем остальные
+    existing = {ix["name"] for ix in inspect(connection).get_indexes("cart_items")}
+    if "ux_cart_items_cart_product" not in existing:
+        connection.execute(text("""
+            UPDATE cart_items SET quantity = (
+                SELECT SUM(dup.quantity) FROM cart_items AS dup
+                WHERE dup.cart_id = cart_items.cart_id AND dup.product_id = cart_items.product_id
+            )
+            WHERE id IN (
+                SELECT MIN(id) FROM cart_items GROUP BY cart_id, product_id HAVING COUNT(*) > 1
+            )
+        """))
+        connection.execute(text("""
+            DELETE FROM cart_items
+            WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY cart_id, product_id)
+        """))
+
+    create_index(connection, table_index(CartItem.__table__, "ux_cart_items_cart_product"))
+    create_index(connection, table_index(Cart.__table__, "ix_carts_updated_at"))
+    create_index(connection, table_index(Order.__table__, "ix_orders_status"))
+    create_index(connection, table_index(OrderItem.__table__, "ix_order_items_order_id"))
+    create_index(connection, table_index(OrderItem.__table__, "ix_order_items_product_id"))
+
+
+@migration(2, "products(category) and orders(created_at, status)")
+def category_and_order_period_indexes(connection: Connection):
+    create_index(connection, table_index(Product.__table__, "ix_products_category"))
+    create_index(connection, table_index(Order.__table__, "ix_orders_created_at_status"))
+    # одиночный индекс по дате — префикс нового составного
+    drop_index(connection, "ix_orders_created_at")
+
+
+@migration(3, "case-insensitive venues(city) and venues(country) for the concert location filter")
+def venue_location_indexes(connection: Connection):
+    if connection.dialect.name == "sqlite":
+        create_index(connection, table_index(Venue.__table__, "ix_venues_city_nocase"))
+        create_index(connection, table_index(Venue.__table__, "ix_venues_country_nocase"))
+    # обычные индексы с BINARY-сопоставлением префиксный LIKE не использует
+    drop_index(connection, "ix_venues_city")
+    drop_index(connection, "ix_venues_country")
+
+
+def applied_versions(engine: Engine) -> set:
+    SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as connection:
+        return set(connection.scalars(select(SchemaMigration.version)))
+
+
+def migrate(engine: Engine) -> List[int]:
+    """Применяет новые миграции по порядку. Если два процесса стартуют
+    одновременно, второй упрётся в номер версии в schema_migrations и
+    пропустит миграцию — её шаги повторяемы, так что это безопасно."""
+    done = applied_versions(engine)
+    applied = []
+    for step in sorted(MIGRATIONS, key=lambda m: m.version):
+        if step.version in done:
+            continue
+        try:
+            with engine.begin() as connection:
+                step.apply(connection)
+                connection.execute(
+                    insert(SchemaMigration).values(
+                        version=step.version, description=step.description, applied_at=datetime.utcnow()
+                    )
+                )
+        except IntegrityError:
+            continue
+        print(f"✅ Миграция {step.version}: {step.description}")
+        applied.append(step.version)
+    return applied
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Миграции схемы")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=["upgrade", "status"])
+    args = parser.parse_args()
+
+    if args.command == "status":
+        done = applied_versions(engine)
+        for step in sorted(MIGRATIONS, key=lambda m: m.version):
+            print(f"{'✅' if step.version in done else '⏳'} {step.version:>3}  {step.description}")
+    else:
+        # на пустой БД сначала нужны сами таблицы
+        Base.metadata.create_all(bind=engine)
+        applied = migrate(engine)
+        if not applied:
+            print("✅ Схема актуальна")
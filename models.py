@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Index, LargeBinary, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -10,23 +10,89 @@ class Product(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    category = Column(String, nullable=False)
+    category = Column(String, nullable=False, index=True)
     description = Column(String)
     price = Column(Float, nullable=False)
     image_url = Column(String)
     stock = Column(Integer, default=10)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class Venue(Base):
+    __tablename__ = "venues"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+    country = Column(String, nullable=False)
+    
+    # фильтр по городу/стране — префиксный LIKE без учёта регистра, а SQLite
+    # ведёт его по индексу, только если у индекса сопоставление NOCASE
+    __table_args__ = (
+        Index("ix_venues_city_nocase", city.collate("NOCASE")).ddl_if(dialect="sqlite"),
+        Index("ix_venues_country_nocase", country.collate("NOCASE")).ddl_if(dialect="sqlite"),
+    )
+
+class Concert(Base):
+    __tablename__ = "concerts"
+    __table_args__ = (
+        Index("ix_concerts_date_id", "date", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String, nullable=False)
+    venue_id = Column(Integer, ForeignKey("venues.id"), nullable=False, index=True)
+    date = Column(Date, nullable=False)
+    description = Column(String)
+    price = Column(Float, nullable=False)
+    image_url = Column(String)
+    badge = Column(String)
+    available = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    venue = relationship("Venue")
+
+class TicketTier(Base):
+    __tablename__ = "ticket_tiers"
+    __table_args__ = (
+        Index("ux_ticket_tiers_concert_code", "concert_id", "code", unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    concert_id = Column(Integer, ForeignKey("concerts.id"), nullable=False)
+    code = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    price = Column(Float, nullable=False)
+    capacity = Column(Integer, nullable=False)
+    sold = Column(Integer, nullable=False, default=0)
+    held = Column(Integer, nullable=False, default=0)
+
+class TicketHold(Base):
+    __tablename__ = "ticket_holds"
+    __table_args__ = (
+        Index("ix_ticket_holds_status_expires", "status", "expires_at"),
+    )
+    
+    id = Column(String, primary_key=True)
+    tier_id = Column(Integer, ForeignKey("ticket_tiers.id"), nullable=False)
+    session_id = Column(String, nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="active")
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Cart(Base):
     __tablename__ = "carts"
     
     id = Column(String, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     items = relationship("CartItem", back_populates="cart", cascade="all, delete-orphan")
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        Index("ux_cart_items_cart_product", "cart_id", "product_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     cart_id = Column(String, ForeignKey("carts.id"))
@@ -39,6 +105,11 @@ class CartItem(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # период выгрузки/отчёта и статус в одном индексе; created_at-префикс
+        # заменяет отдельный индекс по дате
+        Index("ix_orders_created_at_status", "created_at", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     order_number = Column(String, unique=True, index=True)
@@ -46,7 +117,7 @@ class Order(Base):
     customer_email = Column(String)
     customer_phone = Column(String)
     total_amount = Column(Float)
-    status = Column(String, default="pending")
+    status = Column(String, default="pending", index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
@@ -54,10 +125,118 @@ class OrderItem(Base):
     __tablename__ = "order_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     product_name = Column(String)
     quantity = Column(Integer)
     price = Column(Float)
     
-    order = relationship("Order", back_populates="items")
\ No newline at end of file
+    order = relationship("Order", back_populates="items")
+
+class SalesDaily(Base):
+    """Итоги продаж за день; обновляются при оформлении заказа."""
+    __tablename__ = "sales_daily"
+    
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class ProductSalesDaily(Base):
+    """Продажи товара за день: из этой таблицы строятся отчёты и топ продаж."""
+    __tablename__ = "product_sales_daily"
+    __table_args__ = (
+        Index("ix_product_sales_daily_product_day", "product_id", "day"),
+    )
+    
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    product_name = Column(String)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class CacheEvent(Base):
+    """Сброс кэшей в соседних воркерах: пишется в той же транзакции, что и изменение."""
+    __tablename__ = "cache_events"
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True)
+    cache = Column(String, nullable=False)
+    key = Column(String, nullable=False, default="")
+    origin = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class WaitingRoomState(Base):
+    """Счётчики очереди на дропах (одна строка): общие для всех воркеров,
+    поэтому номер и темп допуска не зависят от того, какой воркер ответил."""
+    __tablename__ = "waiting_room"
+    
+    id = Column(Integer, primary_key=True)
+    issued = Column(Integer, nullable=False, default=0)
+    admitted = Column(Float, nullable=False, default=0)
+    # time.time() последнего сдвига границы допуска
+    updated_at = Column(Float, nullable=False)
+
+class WorkerLease(Base):
+    """Аренда фоновой задачи: её выполняет только воркер-владелец (shop/leases.py)."""
+    __tablename__ = "worker_leases"
+    
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class ContactMessage(Base):
+    """Сообщение из формы на странице контактов."""
+    __tablename__ = "contact_messages"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class OutboxMessage(Base):
+    """Письмо к отправке: ставится в очередь в той же транзакции, что заказ или
+    сообщение, и отправляется фоновым воркером (shop/outbox.py)."""
+    __tablename__ = "outbox_messages"
+    __table_args__ = (
+        Index("ix_outbox_messages_status_next_attempt", "status", "next_attempt_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    reply_to = Column(String)
+    # pending -> sending -> sent; после OUTBOX_MAX_ATTEMPTS неудач — failed
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+class IdempotencyRecord(Base):
+    """Ответ на запрос с Idempotency-Key: повтор запроса получает его без
+    повторного выполнения (shop/idempotency.py)."""
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    # processing — запрос выполняется (до locked_until), completed — ответ сохранён
+    status = Column(String, nullable=False, default="processing")
+    status_code = Column(Integer)
+    headers = Column(Text)
+    body = Column(LargeBinary)
+    locked_until = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class SchemaMigration(Base):
+    """Применённые миграции схемы (migrations.py)."""
+    __tablename__ = "schema_migrations"
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
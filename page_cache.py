@@ -0,0 +1,158 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from assets import MANIFEST_PATH
+
+
+@dataclass
+class PageRule:
+    template: str
+    ttl: int = 300
+    bypass: bool = False
+
+
+@dataclass
+class CachedPage:
+    key: Tuple
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    gzip_body: Optional[bytes]
+    etag: str
+    last_modified: float
+    expires: float
+
+
+def _mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class PageCacheMiddleware:
+    """Кэш готового HTML для страниц, которые одинаковы для всех посетителей.
+
+    Ключ — mtime шаблона и manifest.json статики, поэтому правка шаблона или
+    пересборка ассетов сразу дают новую версию страницы."""
+
+    def __init__(self, app, pages: Dict[str, PageRule], templates_dir: str = "templates",
+                 min_gzip_size: int = 1024):
+        self.app = app
+        self.pages = pages
+        self.templates_dir = templates_dir
+        self.min_gzip_size = min_gzip_size
+        self._cache: Dict[str, CachedPage] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def __call__(self, scope, receive, send):
+        rule = self.pages.get(scope.get("path")) if scope["type"] == "http" else None
+        if (rule is None or rule.bypass or scope["method"] not in ("GET", "HEAD")
+                or scope.get("query_string")):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        template_path = os.path.join(self.templates_dir, rule.template)
+        key = (_mtime(template_path), _mtime(str(MANIFEST_PATH)))
+
+        page = self._fresh(path, key)
+        status = b"HIT"
+        if page is None:
+            lock = self._locks.setdefault(path, asyncio.Lock())
+            async with lock:
+                page = self._fresh(path, key)
+                if page is None:
+                    page, uncacheable = await self._render(scope, receive, rule, key)
+                    status = b"MISS"
+            if page is None:
+                # ответ не кэшируется (ошибка или set-cookie) — отдаём как есть
+                start, body = uncacheable
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+        await self._send(scope, send, page, status)
+
+    def _fresh(self, path: str, key: Tuple) -> Optional[CachedPage]:
+        page = self._cache.get(path)
+        if page is not None and page.key == key and page.expires > time.monotonic():
+            return page
+        return None
+
+    async def _render(self, scope, receive, rule: PageRule, key: Tuple):
+        started = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                started.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app({**scope, "method": "GET"}, receive, capture)
+
+        body = b"".join(chunks)
+        headers = [
+            (name, value) for name, value in started.get("headers", [])
+            if name.lower() not in (b"content-length", b"etag", b"last-modified")
+        ]
+        if started.get("status") != 200 or any(name.lower() == b"set-cookie" for name, _ in headers):
+            return None, (started, b"" if scope["method"] == "HEAD" else body)
+
+        gzip_body = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= self.min_gzip_size else None
+        page = CachedPage(
+            key=key,
+            headers=headers,
+            body=body,
+            gzip_body=gzip_body,
+            etag=f'"{hashlib.sha1(body).hexdigest()}"',
+            last_modified=max(key) / 1e9 if max(key) else time.time(),
+            expires=time.monotonic() + rule.ttl
+        )
+        self._cache[scope["path"]] = page
+        return page, None
+
+    async def _send(self, scope, send, page: CachedPage, status: bytes):
+        request_headers = {name.lower(): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        headers = [
+            *page.headers,
+            (b"etag", page.etag.encode()),
+            (b"last-modified", formatdate(page.last_modified, usegmt=True).encode()),
+            (b"cache-control", b"no-cache"),
+            (b"vary", b"Accept-Encoding"),
+            (b"x-page-cache", status)
+        ]
+
+        if self._not_modified(request_headers, page):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        body = page.body
+        if page.gzip_body is not None and "gzip" in request_headers.get(b"accept-encoding", ""):
+            body = page.gzip_body
+            headers.append((b"content-encoding", b"gzip"))
+        headers.append((b"content-length", str(len(body)).encode()))
+
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    @staticmethod
+    def _not_modified(request_headers: Dict[bytes, str], page: CachedPage) -> bool:
+        if_none_match = request_headers.get(b"if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or page.etag in tags
+        if_modified_since = request_headers.get(b"if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= int(page.last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
@@ -0,0 +1,80 @@
+"""Запуск для продакшена: схема, сиды и статика готовятся один раз,
+затем uvicorn поднимает несколько воркеров на общем сокете.
+
+    python serve.py                      # воркеров по числу CPU (WEB_CONCURRENCY)
+    python serve.py --workers 4 --port 8080
+
+SIGTERM/SIGINT: воркеры перестают принимать соединения и дожидаются текущих
+запросов (оформление заказа — одна транзакция) не дольше GRACEFUL_SHUTDOWN_SECONDS.
+Очередь дропов общая для всех воркеров (счётчики в таблице waiting_room),
+а снятие броней и чистку корзин ведёт один воркер (аренды, shop/leases.py).
+Свои у каждого воркера: /metrics (счётчики и гистограммы только этого
+процесса — при сборе суммируйте по воркерам) и token bucket лимита запросов
+(RATE_LIMIT_PER_SECOND и RATE_LIMIT_BURST действуют на воркер: клиент, чьи
+соединения попадают в разные воркеры, получит до rate × число воркеров).
+Для разработки по-прежнему `python main.py` с перезагрузкой.
+"""
+import argparse
+import os
+import secrets
+
+import uvicorn
+from dotenv import load_dotenv
+
+
+def bootstrap():
+    from assets import build as build_assets
+    from config import config
+    from database import engine, init_db
+    from templating import precompile as precompile_templates
+
+    init_db()
+    print("✅ Database initialized")
+    if config.ASSETS_BUILD_ON_STARTUP:
+        build_assets()
+        print("✅ Статика собрана")
+    # заполняет bytecode-кэш на диске: воркеры загрузят шаблоны без компиляции
+    precompile_templates()
+    # соединения родителя воркерам не нужны
+    engine.dispose()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Production server")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=None, help="по умолчанию WEB_CONCURRENCY")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # настройки для воркеров выставляются до первого импорта config: с --workers 1
+    # uvicorn поднимает приложение в этом же процессе и с этим же config
+    os.environ["BOOTSTRAP_ON_STARTUP"] = "0"
+    os.environ.setdefault("TEMPLATE_AUTO_RELOAD", "0")
+    # пропуск из очереди, выданный одним воркером, должен приниматься всеми
+    if not os.getenv("ADMISSION_SECRET"):
+        os.environ["ADMISSION_SECRET"] = secrets.token_hex(32)
+
+    from config import config
+    workers = args.workers or config.WEB_CONCURRENCY
+    if workers > 1:
+        # воркеры — отдельные процессы и импортируют config заново
+        os.environ.setdefault("CACHE_SYNC_ENABLED", "1")
+
+    bootstrap()
+
+    print(f"🚀 Запуск {workers} воркеров на {args.host}:{args.port}")
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        timeout_graceful_shutdown=config.GRACEFUL_SHUTDOWN_SECONDS,
+        proxy_headers=True,
+        log_level=args.log_level
+    )
+
+
+if __name__ == "__main__":
+    main()
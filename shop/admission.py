@@ -0,0 +1,247 @@
+import hashlib
+import hmac
+import json
+import math
+import secrets
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import case, literal, select, update
+from sqlalchemy.orm import Session
+
+from config import config
+from database import AsyncSessionLocal, dialect_insert
+from models import WaitingRoomState
+
+
+class TokenBucket:
+    """Token bucket на каждый ключ (cookie сессии или IP), ограниченный по памяти."""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """0 если запрос пропущен, иначе через сколько секунд появится токен."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens >= 1:
+            wait = 0.0
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class WaitingRoomCounters:
+    """Счётчики очереди в строке waiting_room. Граница допуска admitted
+    сдвигается со скоростью rate, но не дальше issued; сдвиг записывается
+    только при выдаче номера, а между выдачами считается при чтении."""
+
+    ROW_ID = 1
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def join(self, rate: float, now: float = None) -> int:
+        now = now or time.time()
+        state = WaitingRoomState
+        elapsed = case((state.updated_at < now, literal(now) - state.updated_at), else_=0.0)
+        advanced = state.admitted + elapsed * rate
+        # одно UPDATE: воркеры не перезапишут номера друг друга
+        stmt = (
+            update(state)
+            .where(state.id == self.ROW_ID)
+            .values(
+                issued=state.issued + 1,
+                admitted=case((advanced > state.issued, state.issued), else_=advanced),
+                updated_at=now
+            )
+            .returning(state.issued)
+        )
+        issued = self.db.execute(stmt).scalar()
+        if issued is None:
+            self.db.execute(
+                dialect_insert(self.db, state)
+                .values(id=self.ROW_ID, issued=0, admitted=0, updated_at=now)
+                .on_conflict_do_nothing(index_elements=[state.id])
+            )
+            issued = self.db.execute(stmt).scalar()
+        self.db.commit()
+        return issued - 1
+
+    def admitted(self, rate: float, now: float = None) -> float:
+        now = now or time.time()
+        row = self.db.execute(
+            select(WaitingRoomState.issued, WaitingRoomState.admitted, WaitingRoomState.updated_at)
+            .where(WaitingRoomState.id == self.ROW_ID)
+        ).first()
+        if row is None:
+            return 0.0
+        return min(float(row.issued), row.admitted + max(0.0, now - row.updated_at) * rate)
+
+
+class WaitingRoom:
+    """FIFO очередь без брокера: каждому выдаётся номер, а граница допуска
+    сдвигается со скоростью rate человек в секунду, пока в очереди кто-то есть.
+    Счётчики общие для всех воркеров serve.py (таблица waiting_room)."""
+
+    def __init__(self, rate: float, session_factory=AsyncSessionLocal):
+        self.rate = rate
+        self.session_factory = session_factory
+
+    async def _run(self, method: str, *args):
+        async with self.session_factory() as db:
+            return await db.run_sync(lambda session: getattr(WaitingRoomCounters(session), method)(*args))
+
+    async def join(self) -> int:
+        return await self._run("join", self.rate)
+
+    async def position(self, ticket: int) -> int:
+        """Место в очереди; 0 — можно пускать."""
+        admitted = await self._run("admitted", self.rate)
+        return max(0, ticket + 1 - math.floor(admitted))
+
+
+class AdmissionController:
+    def __init__(self):
+        self.secret = (config.ADMISSION_SECRET or secrets.token_hex(32)).encode()
+        self.buckets = TokenBucket(config.RATE_LIMIT_PER_SECOND, config.RATE_LIMIT_BURST)
+        self.room = WaitingRoom(config.WAITING_ROOM_ADMIT_PER_SECOND)
+        self.waiting_room_enabled = config.WAITING_ROOM_ENABLED
+
+    def sign(self, payload: dict) -> str:
+        body = json.dumps(payload, separators=(",", ":")).encode().hex()
+        signature = hmac.new(self.secret, body.encode(), hashlib.sha256).hexdigest()
+        return f"{body}.{signature}"
+
+    def verify(self, token: Optional[str], kind: str) -> Optional[dict]:
+        if not token or "." not in token:
+            return None
+        body, signature = token.rsplit(".", 1)
+        expected = hmac.new(self.secret, body.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature, expected):
+            return None
+        try:
+            payload = json.loads(bytes.fromhex(body))
+        except ValueError:
+            return None
+        if payload.get("kind") != kind or payload.get("exp", 0) < time.time():
+            return None
+        return payload
+
+    async def issue_queue_token(self) -> Tuple[str, int]:
+        ticket = await self.room.join()
+        token = self.sign({"kind": "queue", "ticket": ticket, "exp": time.time() + 3600})
+        return token, ticket
+
+    def issue_pass(self) -> str:
+        return self.sign({"kind": "pass", "exp": time.time() + config.WAITING_ROOM_PASS_MINUTES * 60})
+
+    async def queue_status(self, queue_token: Optional[str]) -> Optional[dict]:
+        payload = self.verify(queue_token, "queue")
+        if payload is None:
+            return None
+        ahead = await self.room.position(payload["ticket"])
+        return {
+            "admitted": ahead == 0,
+            "position": ahead,
+            "eta_seconds": math.ceil(ahead / self.room.rate) if ahead else 0
+        }
+
+
+admission = AdmissionController()
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware перед API магазина: лимит запросов на сессию и,
+    во время дропов, очередь перед добавлением в корзину и оформлением."""
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith("/shop/api/") or path == "/shop/api/queue/status":
+            await self.app(scope, receive, send)
+            return
+
+        cookies = parse_cookies(scope)
+
+        if config.RATE_LIMIT_ENABLED:
+            client = scope.get("client")
+            key = cookies.get(config.SESSION_COOKIE_NAME) or (client[0] if client else "anonymous")
+            wait = self.controller.buckets.take(key)
+            if wait:
+                await send_json(send, 429, {"detail": "Too many requests"},
+                                [(b"retry-after", str(math.ceil(wait)).encode())])
+                return
+
+        if (self.controller.waiting_room_enabled and scope["method"] != "GET"
+                and path in config.WAITING_ROOM_PATHS
+                and self.controller.verify(cookies.get(config.ADMISSION_COOKIE_NAME), "pass") is None):
+            status = await self.controller.queue_status(cookies.get(config.QUEUE_COOKIE_NAME))
+            headers = []
+            if status is None:
+                token, _ = await self.controller.issue_queue_token()
+                status = await self.controller.queue_status(token)
+                headers.append((b"set-cookie", cookie_header(config.QUEUE_COOKIE_NAME, token, 3600)))
+            if not status["admitted"]:
+                headers.append((b"retry-after", str(max(1, status["eta_seconds"])).encode()))
+                await send_json(send, 503, {"detail": "Waiting room", "queue": status}, headers)
+                return
+            # очередь подошла, но пропуск ещё не выдан — выдаём прямо в этом ответе
+            await self.app(scope, receive, with_headers(send, [
+                (b"set-cookie", cookie_header(config.ADMISSION_COOKIE_NAME, self.controller.issue_pass(),
+                                              config.WAITING_ROOM_PASS_MINUTES * 60))
+            ]))
+            return
+
+        await self.app(scope, receive, send)
+
+
+def parse_cookies(scope) -> dict:
+    cookies = {}
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            for chunk in value.decode("latin-1").split(";"):
+                key, _, val = chunk.strip().partition("=")
+                if key:
+                    cookies[key] = val
+    return cookies
+
+
+def cookie_header(name: str, value: str, max_age: int) -> bytes:
+    return f"{name}={value}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=lax".encode()
+
+
+def with_headers(send, extra):
+    async def wrapped(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": [*message.get("headers", []), *extra]}
+        await send(message)
+    return wrapped
+
+
+async def send_json(send, status: int, payload: dict, headers=()):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
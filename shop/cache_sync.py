@@ -0,0 +1,94 @@
+"""Сброс кэшей процесса во всех воркерах.
+
+Изменение, после которого кэш устарел, пишет строку в cache_events в своей
+же транзакции (publish). Каждый воркер дёшево опрашивает PRAGMA data_version
+на отдельном соединении и читает новые события только когда БД кто-то
+изменил; свои события воркер пропускает — он уже обновил кэш сам."""
+import asyncio
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy import delete, insert, select, func
+from sqlalchemy.orm import Session
+
+from config import config
+from models import CacheEvent
+
+_handlers: Dict[str, List[Callable[[str], None]]] = {}
+
+
+def on_invalidate(cache: str, handler: Callable[[str], None]):
+    _handlers.setdefault(cache, []).append(handler)
+
+
+def publish(session: Session, cache: str, key: str = ""):
+    """Коммит делает вызывающий — событие уходит вместе с изменением."""
+    if not config.CACHE_SYNC_ENABLED:
+        return
+    session.connection().execute(
+        insert(CacheEvent).values(cache=cache, key=key, origin=os.getpid())
+    )
+
+
+class CacheEventListener:
+    def __init__(self, database_path: str, last_id: int = 0):
+        # своё соединение: data_version меняется, только если пишет кто-то другой
+        self.conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True, check_same_thread=False)
+        self.data_version = None
+        self.last_id = last_id
+
+    def poll(self) -> int:
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.data_version:
+            return 0
+        self.data_version = version
+
+        rows = self.conn.execute(
+            "SELECT id, cache, key, origin FROM cache_events WHERE id > ? ORDER BY id", (self.last_id,)
+        ).fetchall()
+        pid = os.getpid()
+        for event_id, cache, key, origin in rows:
+            self.last_id = event_id
+            if origin == pid:
+                continue
+            for handler in _handlers.get(cache, ()):
+                handler(key)
+        return len(rows)
+
+    def close(self):
+        self.conn.close()
+
+
+async def cache_sync_worker(session_factory, interval: float = None):
+    """Фоновая задача из lifespan для запуска в несколько воркеров (serve.py)."""
+    interval = interval or config.CACHE_SYNC_POLL_SECONDS
+
+    async with session_factory() as db:
+        url = db.get_bind().url
+        if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+            print("⚠️ Синхронизация кэшей между воркерами поддерживается только для файла SQLite")
+            return
+        last_id = await db.scalar(select(func.coalesce(func.max(CacheEvent.id), 0)))
+
+    listener = CacheEventListener(url.database, last_id)
+    pruned_at = datetime.utcnow()
+    try:
+        while True:
+            try:
+                listener.poll()
+                if datetime.utcnow() - pruned_at > timedelta(seconds=config.CACHE_EVENTS_TTL_SECONDS):
+                    pruned_at = datetime.utcnow()
+                    async with session_factory() as db:
+                        await db.execute(
+                            delete(CacheEvent).where(CacheEvent.created_at < pruned_at - timedelta(
+                                seconds=config.CACHE_EVENTS_TTL_SECONDS
+                            ))
+                        )
+                        await db.commit()
+            except Exception as error:
+                print(f"⚠️ Ошибка синхронизации кэшей: {error}")
+            await asyncio.sleep(interval)
+    finally:
+        listener.close()
@@ -1,8 +1,101 @@
+from sqlalchemy import select, update, delete, literal, func
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from assets import asset_url
+from config import config
+from database import dialect_insert
 from models import Cart, CartItem, Product
+from shop.cache_sync import on_invalidate, publish
+from shop.live import live_hub
+import time
 import uuid
+from collections import OrderedDict
+from datetime import datetime
 from typing import Dict, List, Optional
 
+def calculate_shipping(subtotal: float) -> float:
+    return 0 if subtotal >= config.FREE_SHIPPING_THRESHOLD else config.SHIPPING_COST
+
+def build_cart_details(session_id: str, rows) -> Dict:
+    items = []
+    subtotal = 0
+    total_items = 0
+    
+    for row in rows:
+        item_total = row.price * row.quantity
+        items.append({
+            "id": row.id,
+            "product_id": row.product_id,
+            "name": row.name,
+            "price": row.price,
+            "quantity": row.quantity,
+            "total": item_total,
+            "image_url": asset_url(row.image_url),
+            "stock": row.stock
+        })
+        subtotal += item_total
+        total_items += row.quantity
+    
+    shipping = calculate_shipping(subtotal)
+    total = subtotal + shipping
+    
+    return {
+        "session_id": session_id,
+        "items": items,
+        "total_items": total_items,
+        "item_count": len(items),
+        "subtotal": round(subtotal, 2),
+        "shipping": shipping,
+        "total": round(total, 2),
+        "free_shipping_threshold": config.FREE_SHIPPING_THRESHOLD,
+        "has_free_shipping": shipping == 0
+    }
+
+def make_summary(item_count: int, total_items: int, subtotal: float) -> Dict:
+    shipping = calculate_shipping(subtotal)
+    return {
+        "item_count": item_count,
+        "total_items": total_items,
+        "subtotal": round(subtotal, 2),
+        "total": round(subtotal + shipping, 2)
+    }
+
+def summarize_cart(cart: Dict) -> Dict:
+    return make_summary(cart["item_count"], cart["total_items"], cart["subtotal"])
+
+
+class CartSummaryCache:
+    """Сводка корзины (количество и сумма) на сессию для бейджа в шапке.
+
+    Обновляется мутациями корзины в этом процессе, поэтому обычный опрос
+    бейджа вообще не ходит в БД; TTL ограничивает устаревание между воркерами."""
+
+    def __init__(self, ttl: float = 30, max_size: int = 50_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        entry = self._entries.get(session_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, session_id: str, summary: Dict):
+        self._entries.pop(session_id, None)
+        self._entries[session_id] = (time.monotonic() + self.ttl, summary)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, session_id: str):
+        self._entries.pop(session_id, None)
+
+
+cart_summaries = CartSummaryCache()
+on_invalidate("cart_summary", cart_summaries.discard)
+
+MAX_BATCH_OPERATIONS = 50
+
 class CartManager:
     def __init__(self, db: Session):
         self.db = db
@@ -18,130 +111,225 @@ class CartManager:
         
         return cart
     
-    def add_to_cart(self, session_id: str, product_id: int, quantity: int = 1) -> Dict:
-        cart = self.get_or_create_cart(session_id)
-        product = self.db.query(Product).filter(Product.id == product_id).first()
-        
-        if not product:
-            return {"success": False, "error": "Product not found"}
+    def _touch_cart(self, session_id: str):
+        stmt = dialect_insert(self.db, Cart).values(id=session_id, created_at=datetime.utcnow(), updated_at=datetime.utcnow())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Cart.id],
+            set_={"updated_at": stmt.excluded.updated_at}
+        )
+        self.db.execute(stmt)
+    
+    def _apply_add(self, session_id: str, product_id: int, quantity: int) -> Dict:
+        # при quantity <= 0 условие по остатку выполняется всегда, и строка
+        # корзины уменьшилась бы или ушла в минус
+        if quantity < 1:
+            return {"success": False, "error": "Quantity must be at least 1"}
         
-        if product.stock < quantity:
-            return {"success": False, "error": "Not enough stock"}
+        # одна вставка: строка появляется только если товар есть и его хватает,
+        # при повторном добавлении количество увеличивается атомарно
+        source = select(
+            literal(session_id), Product.id, literal(quantity), literal(datetime.utcnow())
+        ).where(Product.id == product_id, Product.stock >= quantity)
+        stmt = dialect_insert(self.db, CartItem).from_select(
+            ["cart_id", "product_id", "quantity", "added_at"], source
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id],
+            set_={"quantity": CartItem.quantity + stmt.excluded.quantity}
+        ).returning(CartItem.id, CartItem.quantity)
+        row = self.db.execute(stmt).first()
         
-        cart_item = self.db.query(CartItem).filter(
-            CartItem.cart_id == session_id,
-            CartItem.product_id == product_id
-        ).first()
+        if row is None:
+            exists = self.db.scalar(select(Product.id).where(Product.id == product_id))
+            return {"success": False, "error": "Not enough stock" if exists else "Product not found"}
         
-        if cart_item:
-            cart_item.quantity += quantity
+        return {"success": True, "cart_item_id": row.id, "quantity": row.quantity}
+    
+    def _apply_update(self, session_id: str, item_id: int, quantity: int) -> Dict:
+        if quantity <= 0:
+            result = self.db.execute(
+                delete(CartItem).where(CartItem.id == item_id, CartItem.cart_id == session_id)
+            )
+            action = "removed"
         else:
-            cart_item = CartItem(
-                cart_id=session_id,
-                product_id=product_id,
-                quantity=quantity
+            stock = select(Product.stock).where(Product.id == CartItem.product_id).scalar_subquery()
+            result = self.db.execute(
+                update(CartItem)
+                .where(CartItem.id == item_id, CartItem.cart_id == session_id, stock >= quantity)
+                .values(quantity=quantity)
+                .execution_options(synchronize_session=False)
             )
-            self.db.add(cart_item)
+            action = "updated"
         
-        self.db.commit()
+        if result.rowcount == 0:
+            found = self.db.scalar(
+                select(CartItem.id).where(CartItem.id == item_id, CartItem.cart_id == session_id)
+            )
+            return {"success": False, "error": "Not enough stock" if found else "Item not found in cart"}
         
-        return {
-            "success": True,
-            "cart_item_id": cart_item.id,
-            "product_name": product.name,
-            "quantity": cart_item.quantity
-        }
+        return {"success": True, "action": action, "item_id": item_id, "quantity": quantity}
     
-    def update_cart_item(self, session_id: str, item_id: int, quantity: int) -> Dict:
-        cart_item = self.db.query(CartItem).filter(
-            CartItem.id == item_id,
-            CartItem.cart_id == session_id
-        ).first()
-        
-        if not cart_item:
-            return {"success": False, "error": "Item not found in cart"}
+    def _apply_remove(self, session_id: str, item_id: int) -> Dict:
+        result = self.db.execute(
+            delete(CartItem).where(CartItem.id == item_id, CartItem.cart_id == session_id)
+        )
         
-        product = self.db.query(Product).filter(Product.id == cart_item.product_id).first()
+        if result.rowcount == 0:
+            return {"success": False, "error": "Item not found"}
         
-        if quantity <= 0:
-            self.db.delete(cart_item)
-            action = "removed"
-        else:
-            if product and product.stock < quantity:
-                return {"success": False, "error": "Not enough stock"}
-            cart_item.quantity = quantity
-            action = "updated"
+        return {"success": True, "item_id": item_id}
+    
+    def _finish(self, session_id: str, result: Dict) -> Dict:
+        """Откатывает неудачную мутацию; удачную фиксирует вместе со свежей корзиной."""
+        if not result["success"]:
+            self.db.rollback()
+            return result
         
+        result["cart"] = self.get_cart_details(session_id)
+        publish(self.db, "cart_summary", session_id)
         self.db.commit()
+        return result
+    
+    def add_to_cart(self, session_id: str, product_id: int, quantity: int = 1) -> Dict:
+        self._touch_cart(session_id)
+        result = self._finish(session_id, self._apply_add(session_id, product_id, quantity))
         
-        return {
-            "success": True,
-            "action": action,
-            "item_id": item_id,
-            "quantity": quantity
-        }
+        if result["success"]:
+            result["product_name"] = next(
+                (item["name"] for item in result["cart"]["items"] if item["product_id"] == product_id), None
+            )
+        return result
+    
+    def update_cart_item(self, session_id: str, item_id: int, quantity: int) -> Dict:
+        return self._finish(session_id, self._apply_update(session_id, item_id, quantity))
     
     def remove_from_cart(self, session_id: str, item_id: int) -> Dict:
-        cart_item = self.db.query(CartItem).filter(
-            CartItem.id == item_id,
-            CartItem.cart_id == session_id
-        ).first()
+        return self._finish(session_id, self._apply_remove(session_id, item_id))
+    
+    def apply_batch(self, session_id: str, operations: List[Dict]) -> Dict:
+        """Несколько операций с корзиной одной транзакцией: одна фиксация и
+        одно чтение корзины на всю пачку. Если хоть одна операция не прошла,
+        откатывается вся пачка и в ошибке указывается номер операции."""
+        if not operations:
+            return {"success": False, "error": "No operations"}
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            return {"success": False, "error": f"Too many operations (max {MAX_BATCH_OPERATIONS})"}
         
-        if cart_item:
-            self.db.delete(cart_item)
-            self.db.commit()
-            return {"success": True, "item_id": item_id}
+        self._touch_cart(session_id)
+        results = []
         
-        return {"success": False, "error": "Item not found"}
+        for index, operation in enumerate(operations):
+            op = operation.get("op")
+            if op == "add":
+                result = self._apply_add(session_id, operation["product_id"], operation.get("quantity", 1))
+            elif op == "update" and operation.get("quantity") is None:
+                result = {"success": False, "error": "Quantity is required"}
+            elif op == "update":
+                result = self._apply_update(session_id, operation["item_id"], operation["quantity"])
+            elif op == "remove":
+                result = self._apply_remove(session_id, operation["item_id"])
+            else:
+                result = {"success": False, "error": f"Unknown operation: {op}"}
+            
+            if not result["success"]:
+                self.db.rollback()
+                return {"success": False, "error": f"Operation {index}: {result['error']}", "failed_index": index}
+            
+            result.pop("success")
+            results.append({"op": op, **result})
+        
+        return self._finish(session_id, {"success": True, "results": results})
     
     def get_cart_details(self, session_id: str) -> Dict:
-        cart = self.get_or_create_cart(session_id)
-        cart_items = self.db.query(CartItem).filter(CartItem.cart_id == session_id).all()
-        
-        items = []
-        subtotal = 0
-        total_items = 0
-        
-        for item in cart_items:
-            product = self.db.query(Product).filter(Product.id == item.product_id).first()
-            if product:
-                item_total = product.price * item.quantity
-                items.append({
-                    "id": item.id,
-                    "product_id": product.id,
-                    "name": product.name,
-                    "price": product.price,
-                    "quantity": item.quantity,
-                    "total": item_total,
-                    "image_url": product.image_url,
-                    "stock": product.stock
-                })
-                subtotal += item_total
-                total_items += item.quantity
-        
-        from config import config
-        
-        shipping = 0 if subtotal >= config.FREE_SHIPPING_THRESHOLD else config.SHIPPING_COST
-        total = subtotal + shipping
+        rows = self.db.execute(
+            select(
+                CartItem.id,
+                CartItem.quantity,
+                Product.id.label("product_id"),
+                Product.name,
+                Product.price,
+                Product.image_url,
+                Product.stock
+            )
+            .join(Product, Product.id == CartItem.product_id)
+            .where(CartItem.cart_id == session_id)
+            .order_by(CartItem.id)
+        ).all()
         
-        return {
-            "session_id": session_id,
-            "items": items,
-            "total_items": total_items,
-            "item_count": len(items),
-            "subtotal": round(subtotal, 2),
-            "shipping": shipping,
-            "total": round(total, 2),
-            "free_shipping_threshold": config.FREE_SHIPPING_THRESHOLD,
-            "has_free_shipping": shipping == 0
-        }
+        return build_cart_details(session_id, rows)
+    
+    def get_cart_summary(self, session_id: str) -> Dict:
+        row = self.db.execute(
+            select(
+                func.count(CartItem.id).label("item_count"),
+                func.coalesce(func.sum(CartItem.quantity), 0).label("total_items"),
+                func.coalesce(func.sum(CartItem.quantity * Product.price), 0).label("subtotal")
+            )
+            .join(Product, Product.id == CartItem.product_id)
+            .where(CartItem.cart_id == session_id)
+        ).one()
+        
+        return make_summary(row.item_count, row.total_items, row.subtotal)
     
     def clear_cart(self, session_id: str) -> Dict:
-        deleted_count = self.db.query(CartItem).filter(CartItem.cart_id == session_id).delete()
+        deleted_count = self.db.query(CartItem).filter(CartItem.cart_id == session_id).delete(
+            synchronize_session=False
+        )
+        publish(self.db, "cart_summary", session_id)
         self.db.commit()
         
         return {
             "success": True,
             "deleted_items": deleted_count,
             "session_id": session_id
-        }
\ No newline at end of file
+        }
+
+class AsyncCartManager:
+    """Async-версия CartManager: та же логика, но выполняется через
+    AsyncSession.run_sync, поэтому запросы к БД не блокируют event loop."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def _run(self, method: str, *args):
+        return await self.db.run_sync(
+            lambda session: getattr(CartManager(session), method)(*args)
+        )
+    
+    async def _mutate(self, method: str, session_id: str, *args) -> Dict:
+        result = await self._run(method, session_id, *args)
+        if result["success"]:
+            summary = summarize_cart(result["cart"])
+            cart_summaries.put(session_id, summary)
+            live_hub.cart_changed(session_id, summary)
+        return result
+    
+    async def add_to_cart(self, session_id: str, product_id: int, quantity: int = 1) -> Dict:
+        return await self._mutate("add_to_cart", session_id, product_id, quantity)
+    
+    async def update_cart_item(self, session_id: str, item_id: int, quantity: int) -> Dict:
+        return await self._mutate("update_cart_item", session_id, item_id, quantity)
+    
+    async def remove_from_cart(self, session_id: str, item_id: int) -> Dict:
+        return await self._mutate("remove_from_cart", session_id, item_id)
+    
+    async def apply_batch(self, session_id: str, operations: List[Dict]) -> Dict:
+        return await self._mutate("apply_batch", session_id, operations)
+    
+    async def get_cart_details(self, session_id: str) -> Dict:
+        cart = await self._run("get_cart_details", session_id)
+        cart_summaries.put(session_id, summarize_cart(cart))
+        return cart
+    
+    async def get_cart_summary(self, session_id: str) -> Dict:
+        summary = cart_summaries.get(session_id)
+        if summary is None:
+            summary = await self._run("get_cart_summary", session_id)
+            cart_summaries.put(session_id, summary)
+        return summary
+    
+    async def clear_cart(self, session_id: str) -> Dict:
+        result = await self._run("clear_cart", session_id)
+        cart_summaries.put(session_id, make_summary(0, 0, 0))
+        live_hub.cart_changed(session_id, make_summary(0, 0, 0))
+        return result
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from assets import asset_url
+from models import Product
+from shop.cache_sync import on_invalidate, publish
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    products: List[Dict]
+    body: bytes
+    etag: str
+
+
+def serialize_product(p: Product) -> Dict:
+    return {
+        "id": p.id,
+        "name": p.name,
+        "category": p.category,
+        "description": p.description,
+        "price": p.price,
+        "image_url": asset_url(p.image_url),
+        "stock": p.stock
+    }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class CatalogCache:
+    """Каталог товаров в памяти процесса, уже сериализованный в JSON.
+
+    Любое изменение товаров увеличивает version; следующий запрос
+    перестраивает снимок одним запросом к БД, даже если промахов много
+    одновременно."""
+
+    def __init__(self):
+        self.version = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.version += 1
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.version:
+            return snapshot
+
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == self.version:
+                return snapshot
+
+            version = self.version
+            products = (await db.execute(select(Product).order_by(Product.id))).scalars().all()
+            data = [serialize_product(p) for p in products]
+            body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+            snapshot = CatalogSnapshot(version=version, products=data, body=body, etag=etag)
+            self._snapshot = snapshot
+            return snapshot
+
+
+catalog_cache = CatalogCache()
+on_invalidate("catalog", lambda key: catalog_cache.invalidate())
+
+
+def mark_catalog_dirty(session: Session):
+    """Сбросить кэш после коммита этой сессии (для UPDATE/INSERT мимо ORM)."""
+    if not session.info.get("catalog_dirty"):
+        # соседние воркеры узнают об изменении из того же коммита
+        publish(session, "catalog")
+    session.info["catalog_dirty"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _track_product_changes(session, flush_context):
+    changed = (*session.new, *session.dirty, *session.deleted)
+    if any(isinstance(obj, Product) for obj in changed):
+        mark_catalog_dirty(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_catalog(session):
+    if session.info.pop("catalog_dirty", False):
+        catalog_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_catalog_changes(session):
+    session.info.pop("catalog_dirty", None)
@@ -0,0 +1,156 @@
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import column, func, or_, select, table, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from assets import asset_url
+from models import Concert, Venue
+from shop.search_logic import create_fts_index, escape_like, fts_query, fts_table_exists
+
+MAX_PAGE_SIZE = 50
+
+# текст концерта собирается из concerts и venues, поэтому FTS хранит свою
+# копию (а не внешнее содержимое), и триггеры стоят на обеих таблицах
+CONCERT_INDEX_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS concerts_fts USING fts5(
+        title, venue, city, country, tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS concerts_fts_ai AFTER INSERT ON concerts BEGIN
+        INSERT INTO concerts_fts(rowid, title, venue, city, country)
+        SELECT new.id, new.title, venues.name, venues.city, venues.country FROM venues WHERE venues.id = new.venue_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS concerts_fts_ad AFTER DELETE ON concerts BEGIN
+        DELETE FROM concerts_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS concerts_fts_au AFTER UPDATE OF title, venue_id ON concerts BEGIN
+        DELETE FROM concerts_fts WHERE rowid = old.id;
+        INSERT INTO concerts_fts(rowid, title, venue, city, country)
+        SELECT new.id, new.title, venues.name, venues.city, venues.country FROM venues WHERE venues.id = new.venue_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS concerts_fts_venue_au AFTER UPDATE OF name, city, country ON venues BEGIN
+        DELETE FROM concerts_fts WHERE rowid IN (SELECT id FROM concerts WHERE venue_id = new.id);
+        INSERT INTO concerts_fts(rowid, title, venue, city, country)
+        SELECT id, title, new.name, new.city, new.country FROM concerts WHERE venue_id = new.id;
+    END""",
+)
+
+concerts_fts = table("concerts_fts", column("rowid"), column("concerts_fts"))
+
+
+def create_concert_index(connection) -> bool:
+    """FTS5-индекс концертов для свободного поиска q."""
+    return create_fts_index(connection, "concerts_fts", CONCERT_INDEX_DDL, """
+        INSERT INTO concerts_fts(rowid, title, venue, city, country)
+        SELECT concerts.id, concerts.title, venues.name, venues.city, venues.country
+        FROM concerts JOIN venues ON venues.id = concerts.venue_id
+    """)
+
+
+def encode_cursor(concert_date: date, concert_id: int) -> str:
+    return f"{concert_date.isoformat()}_{concert_id}"
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[date, int]]:
+    try:
+        day, concert_id = cursor.split("_", 1)
+        return date.fromisoformat(day), int(concert_id)
+    except ValueError:
+        return None
+
+
+def serialize_concert(concert: Concert, venue: Venue) -> Dict:
+    return {
+        "id": concert.id,
+        "title": concert.title,
+        "location": f"{venue.city}, {venue.country}",
+        "venue": venue.name,
+        "date": concert.date.isoformat(),
+        "image": asset_url(concert.image_url),
+        "description": concert.description,
+        "price": concert.price,
+        "available": concert.available,
+        "badge": concert.badge
+    }
+
+
+class ConcertSearch:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def _prefix(self, col, value: str):
+        pattern = f"{escape_like(value)}%"
+        # LIKE в SQLite и так без учёта регистра (ASCII) и идёт по индексу с
+        # COLLATE NOCASE; ilike дал бы lower(col) LIKE ... и полный проход
+        if self.db.get_bind().dialect.name == "sqlite":
+            return col.like(pattern, escape="\\")
+        return col.ilike(pattern, escape="\\")
+
+    def _filtered(self, stmt, date_from: Optional[date], date_to: Optional[date],
+                  location: str, q: str, use_fts: bool):
+        if date_from:
+            stmt = stmt.where(Concert.date >= date_from)
+        if date_to:
+            stmt = stmt.where(Concert.date <= date_to)
+        if location:
+            # город или страна по префиксу: ix_venues_city_nocase/ix_venues_country_nocase,
+            # а concerts отбираются по ix_concerts_venue_id
+            venue_ids = select(Venue.id).where(or_(
+                self._prefix(Venue.city, location),
+                self._prefix(Venue.country, location)
+            ))
+            stmt = stmt.where(Concert.venue_id.in_(venue_ids))
+        match = fts_query(q)
+        if match and use_fts:
+            stmt = stmt.where(Concert.id.in_(
+                select(concerts_fts.c.rowid).where(concerts_fts.c.concerts_fts.op("MATCH")(match))
+            ))
+        elif match:
+            # без FTS5 подстрока ищется полным проходом
+            pattern = f"%{escape_like(q)}%"
+            stmt = stmt.where(or_(
+                Concert.title.ilike(pattern, escape="\\"),
+                Venue.name.ilike(pattern, escape="\\"),
+                Venue.city.ilike(pattern, escape="\\"),
+                Venue.country.ilike(pattern, escape="\\")
+            ))
+        return stmt
+
+    async def search(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                     location: str = "", q: str = "", after: Optional[str] = None,
+                     limit: int = 6) -> Dict:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        location = location.strip()
+        q = q.strip()
+        use_fts = bool(q) and await fts_table_exists(self.db, "concerts_fts")
+
+        stmt = self._filtered(
+            select(Concert, Venue).join(Venue, Venue.id == Concert.venue_id),
+            date_from, date_to, location, q, use_fts
+        )
+
+        if after:
+            position = decode_cursor(after)
+            stmt = stmt.where(tuple_(Concert.date, Concert.id) > tuple_(*position))
+
+        rows = (await self.db.execute(
+            stmt.order_by(Concert.date, Concert.id).limit(limit + 1)
+        )).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        result = {
+            "items": [serialize_concert(concert, venue) for concert, venue in rows],
+            "next_cursor": encode_cursor(rows[-1][0].date, rows[-1][0].id) if has_more else None
+        }
+
+        # общее количество считаем только для первой страницы
+        if not after:
+            count_stmt = self._filtered(
+                select(func.count(Concert.id)).join(Venue, Venue.id == Concert.venue_id),
+                date_from, date_to, location, q, use_fts
+            )
+            result["total"] = await self.db.scalar(count_stmt)
+
+        return result
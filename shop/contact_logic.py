@@ -0,0 +1,46 @@
+from typing import Dict
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import config
+from models import ContactMessage
+from shop.outbox import enqueue, notify
+
+
+class ContactManager:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def submit(self, name: str, email: str, subject: str, message: str) -> Dict:
+        """Сообщение и письмо фан-клубу записываются одной транзакцией;
+        само письмо отправит воркер очереди."""
+        message_id = self.db.execute(
+            insert(ContactMessage)
+            .values(name=name, email=email, subject=subject, message=message)
+            .returning(ContactMessage.id)
+        ).scalar_one()
+
+        enqueue(
+            self.db,
+            "contact",
+            config.CONTACT_INBOX,
+            f"[{subject}] Message from {name}",
+            f"From: {name} <{email}>\nTopic: {subject}\n\n{message}\n",
+            reply_to=email
+        )
+        self.db.commit()
+        return {"success": True, "message_id": message_id}
+
+
+class AsyncContactManager:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def submit(self, name: str, email: str, subject: str, message: str) -> Dict:
+        result = await self.db.run_sync(
+            lambda session: ContactManager(session).submit(name, email, subject, message)
+        )
+        notify()
+        return result
@@ -0,0 +1,176 @@
+"""Выгрузка заказов построчно (одна строка — одна позиция заказа) в CSV или NDJSON.
+
+Строки читаются из БД пачками через yield_per и сразу кодируются, при
+необходимости сжимаются gzip на лету, поэтому память не растёт с размером
+истории заказов.
+
+    python -m shop.export_logic --format csv --gzip -o orders.csv.gz
+    python -m shop.export_logic --format ndjson --since 2024-05-01 --status pending
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Order, OrderItem
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+BATCH_SIZE = 1000
+FIELDS = (
+    "order_number", "created_at", "status", "customer_name", "customer_email", "customer_phone",
+    "order_total", "product_id", "product_name", "quantity", "price", "line_total"
+)
+# с этих символов Excel/LibreOffice начинают формулу
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def csv_cell(value):
+    """Текст от покупателя не должен стать формулой в таблице: такой ячейке
+    предшествует апостроф."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def export_query(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                 status: Optional[str] = None):
+    stmt = (
+        select(
+            Order.order_number,
+            Order.created_at,
+            Order.status,
+            Order.customer_name,
+            Order.customer_email,
+            Order.customer_phone,
+            Order.total_amount.label("order_total"),
+            OrderItem.product_id,
+            OrderItem.product_name,
+            OrderItem.quantity,
+            OrderItem.price
+        )
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .order_by(Order.id, OrderItem.id)
+    )
+    if date_from:
+        stmt = stmt.where(Order.created_at >= datetime.combine(date_from, time.min))
+    if date_to:
+        stmt = stmt.where(Order.created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+    if status:
+        stmt = stmt.where(Order.status == status)
+    return stmt.execution_options(yield_per=BATCH_SIZE)
+
+
+def export_filename(fmt: str, compress: bool) -> str:
+    return f"orders-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}" + (".gz" if compress else "")
+
+
+class ExportEncoder:
+    """Превращает пачки строк в байты выбранного формата; gzip — потоковый."""
+
+    def __init__(self, fmt: str, compress: bool = False):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.fmt = fmt
+        self._gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self._header_written = False
+
+    def _line(self, row) -> dict:
+        return {
+            "order_number": row.order_number,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "status": row.status,
+            "customer_name": row.customer_name,
+            "customer_email": row.customer_email,
+            "customer_phone": row.customer_phone,
+            "order_total": row.order_total,
+            "product_id": row.product_id,
+            "product_name": row.product_name,
+            "quantity": row.quantity,
+            "price": row.price,
+            "line_total": round(row.price * row.quantity, 2)
+        }
+
+    def _text(self, rows: Iterable) -> str:
+        if self.fmt == "ndjson":
+            return "".join(json.dumps(self._line(row), ensure_ascii=False) + "\n" for row in rows)
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+        if not self._header_written:
+            writer.writeheader()
+            self._header_written = True
+        writer.writerows(
+            {field: csv_cell(value) for field, value in self._line(row).items()} for row in rows
+        )
+        return buffer.getvalue()
+
+    def encode(self, rows: Iterable) -> bytes:
+        data = self._text(rows).encode("utf-8")
+        return self._gzip.compress(data) if self._gzip else data
+
+    def finish(self) -> bytes:
+        # у пустой CSV-выгрузки всё равно должен быть заголовок
+        tail = self.encode([]) if self.fmt == "csv" and not self._header_written else b""
+        if self._gzip:
+            tail += self._gzip.flush()
+        return tail
+
+
+async def stream_orders(session_factory, fmt: str, compress: bool = False,
+                        date_from: Optional[date] = None, date_to: Optional[date] = None,
+                        status: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Тело StreamingResponse. Сессия своя: зависимость запроса закрывается
+    раньше, чем ответ дочитается."""
+    encoder = ExportEncoder(fmt, compress)
+
+    async with session_factory() as db:
+        result = await db.stream(export_query(date_from, date_to, status))
+        async for rows in result.partitions():
+            chunk = encoder.encode(rows)
+            if chunk:
+                yield chunk
+
+    yield encoder.finish()
+
+
+def write_orders(db: Session, out, fmt: str, compress: bool = False,
+                 date_from: Optional[date] = None, date_to: Optional[date] = None,
+                 status: Optional[str] = None) -> int:
+    encoder = ExportEncoder(fmt, compress)
+    lines = 0
+
+    for rows in db.execute(export_query(date_from, date_to, status)).partitions():
+        out.write(encoder.encode(rows))
+        lines += len(rows)
+
+    out.write(encoder.finish())
+    return lines
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Выгрузка заказов")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--gzip", action="store_true", help="сжимать gzip на лету")
+    parser.add_argument("--since", type=date.fromisoformat, help="с дня YYYY-MM-DD")
+    parser.add_argument("--until", type=date.fromisoformat, help="по день YYYY-MM-DD включительно")
+    parser.add_argument("--status")
+    parser.add_argument("-o", "--output", help="файл; по умолчанию stdout")
+    args = parser.parse_args()
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        with SessionLocal() as db:
+            lines = write_orders(db, out, args.format, args.gzip, args.since, args.until, args.status)
+    finally:
+        if args.output:
+            out.close()
+    print(f"✅ Выгружено строк: {lines}", file=sys.stderr)
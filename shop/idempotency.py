@@ -0,0 +1,413 @@
+"""Idempotency-Key для добавления в корзину и оформления заказа.
+
+Клиент на плохой связи повторяет POST с тем же ключом. Первый запрос
+выполняется как обычно, его ответ сохраняется в памяти процесса и в таблице
+idempotency_keys; повтор получает сохранённый ответ и не трогает ни корзину,
+ни остатки. Повтор, пришедший пока исходный запрос ещё выполняется, ждёт его
+ответа: в своём процессе — на future, из другого воркера — опрашивая БД.
+
+Ключ занимается не отдельной транзакцией, а в первом коммите самого запроса
+(before_commit): запрос с ключом пишет в БД дважды — свою транзакцию и
+сохранённый ответ. Если ключ за это время занял другой воркер, транзакция
+запроса откатывается, и он получает ответ того воркера."""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Row, and_, delete, event, or_, select
+from sqlalchemy.orm import Session
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+
+from config import config
+from database import AsyncSessionLocal, async_engine, async_read_engine, dialect_insert
+from models import IdempotencyRecord
+from shop.admission import parse_cookies, send_json
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+DB_POLL_SECONDS = 0.05
+FORM_TYPES = ("application/x-www-form-urlencoded", "multipart/form-data")
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    @classmethod
+    def from_row(cls, row: Row) -> "StoredResponse":
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(row.headers)]
+        return cls(row.fingerprint, row.status_code, headers, row.body)
+
+
+class IdempotencyConflict(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class ClaimLost(Exception):
+    """Ключ занял другой воркер, пока этот выполнял запрос; транзакция запроса откатывается."""
+
+
+@dataclass
+class PendingClaim:
+    key: str
+    fingerprint: str
+    recorded: bool = False
+    closed: bool = False
+
+
+_pending_claim: ContextVar[Optional[PendingClaim]] = ContextVar("idempotency_claim", default=None)
+
+
+@event.listens_for(Session, "before_commit")
+def _record_claim(session):
+    """Первый коммит запроса с Idempotency-Key заодно занимает ключ."""
+    claim = _pending_claim.get()
+    if claim is None or claim.recorded or claim.closed:
+        return
+    if async_read_engine is not async_engine and session.get_bind() is async_read_engine.sync_engine:
+        return
+    if not IdempotencyRecords(session).claim(claim.key, claim.fingerprint):
+        raise ClaimLost(claim.key)
+    claim.recorded = True
+
+
+class IdempotencyRecords:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def lookup(self, key: str, now: datetime = None) -> Optional[Row]:
+        """Действующая запись ключа. Просроченная или брошенная упавшим
+        воркером не в счёт: такой ключ можно занять заново."""
+        now = now or datetime.utcnow()
+        return self.db.execute(
+            select(
+                IdempotencyRecord.fingerprint, IdempotencyRecord.status, IdempotencyRecord.status_code,
+                IdempotencyRecord.headers, IdempotencyRecord.body
+            ).where(
+                IdempotencyRecord.key == key,
+                IdempotencyRecord.expires_at >= now,
+                or_(IdempotencyRecord.status == "completed", IdempotencyRecord.locked_until >= now)
+            )
+        ).first()
+
+    def claim(self, key: str, fingerprint: str, now: datetime = None) -> bool:
+        """Занимает ключ в текущей транзакции, коммит делает вызывающий.
+        False — ключ занят другим запросом."""
+        now = now or datetime.utcnow()
+        stmt = dialect_insert(self.db, IdempotencyRecord).values(
+            key=key,
+            fingerprint=fingerprint,
+            status="processing",
+            locked_until=now + timedelta(seconds=config.IDEMPOTENCY_LOCK_SECONDS),
+            expires_at=now + timedelta(seconds=config.IDEMPOTENCY_TTL_SECONDS)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyRecord.key],
+            set_={
+                "fingerprint": stmt.excluded.fingerprint,
+                "status": "processing",
+                "status_code": None,
+                "headers": None,
+                "body": None,
+                "locked_until": stmt.excluded.locked_until,
+                "expires_at": stmt.excluded.expires_at
+            },
+            where=or_(
+                IdempotencyRecord.expires_at < now,
+                and_(IdempotencyRecord.status == "processing", IdempotencyRecord.locked_until < now)
+            )
+        )
+        return self.db.execute(stmt.returning(IdempotencyRecord.key)).first() is not None
+
+    def complete(self, key: str, response: StoredResponse, now: datetime = None):
+        """Сохраняет ответ. Запрос, который ничего не записал (например, 400 или 422),
+        ключ не занимал — тогда запись создаётся здесь же."""
+        now = now or datetime.utcnow()
+        stmt = dialect_insert(self.db, IdempotencyRecord).values(
+            key=key,
+            fingerprint=response.fingerprint,
+            status="completed",
+            status_code=response.status,
+            headers=json.dumps([(name.decode("latin-1"), value.decode("latin-1"))
+                                for name, value in response.headers]),
+            body=response.body,
+            locked_until=now,
+            expires_at=now + timedelta(seconds=config.IDEMPOTENCY_TTL_SECONDS)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyRecord.key],
+            set_={
+                "status": "completed",
+                "status_code": stmt.excluded.status_code,
+                "headers": stmt.excluded.headers,
+                "body": stmt.excluded.body
+            },
+            where=IdempotencyRecord.status == "processing"
+        )
+        self.db.execute(stmt)
+        self.db.commit()
+
+    def release(self, key: str):
+        self.db.execute(
+            delete(IdempotencyRecord)
+            .where(IdempotencyRecord.key == key, IdempotencyRecord.status == "processing")
+        )
+        self.db.commit()
+
+    def prune(self, now: datetime = None) -> int:
+        deleted = self.db.execute(
+            delete(IdempotencyRecord).where(IdempotencyRecord.expires_at < (now or datetime.utcnow()))
+        ).rowcount
+        self.db.commit()
+        return deleted
+
+
+class IdempotencyStore:
+    """Готовые ответы — в памяти (LRU с TTL) и в БД для остальных воркеров
+    и перезапусков; выполняющиеся запросы — future в _inflight."""
+
+    def __init__(self, session_factory=AsyncSessionLocal, ttl: float = None, max_size: int = None):
+        self.session_factory = session_factory
+        self.ttl = ttl or config.IDEMPOTENCY_TTL_SECONDS
+        self.max_size = max_size or config.IDEMPOTENCY_CACHE_SIZE
+        self._responses: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pruned_at = time.monotonic()
+
+    def _cached(self, key: str) -> Optional[StoredResponse]:
+        entry = self._responses.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._responses[key]
+            return None
+        return entry[1]
+
+    def _remember(self, key: str, response: StoredResponse):
+        self._responses.pop(key, None)
+        self._responses[key] = (time.monotonic() + self.ttl, response)
+        if len(self._responses) > self.max_size:
+            self._responses.popitem(last=False)
+
+    async def _db(self, method: str, *args):
+        async with self.session_factory() as db:
+            return await db.run_sync(lambda session: getattr(IdempotencyRecords(session), method)(*args))
+
+    @staticmethod
+    def _check(response: StoredResponse, fingerprint: str) -> StoredResponse:
+        if response.fingerprint != fingerprint:
+            raise IdempotencyConflict(422, "Idempotency-Key was already used for a different request")
+        return response
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """None — запрос выполняет вызывающий и потом обязательно вызывает finish();
+        иначе сохранённый ответ для повтора."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            response = self._cached(key)
+            if response is not None:
+                return self._check(response, fingerprint)
+
+            pending = self._inflight.get(key)
+            if pending is not None:
+                try:
+                    await asyncio.wait_for(asyncio.shield(pending), max(0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    raise IdempotencyConflict(409, "A request with this Idempotency-Key is still in progress")
+                continue
+
+            # проверка и регистрация без await между ними — дубли в этом процессе встанут в ожидание
+            pending = self._inflight[key] = loop.create_future()
+            try:
+                row = await self._db("lookup", key)
+            except BaseException:
+                self._settle(key, None)
+                raise
+            if row is None:
+                return None
+
+            if row is not None and row.status == "completed":
+                response = StoredResponse.from_row(row)
+                self._remember(key, response)
+                self._settle(key, response)
+                return self._check(response, fingerprint)
+
+            # исходный запрос выполняет другой воркер — ждём его записи в БД
+            self._settle(key, None)
+            if row.fingerprint != fingerprint:
+                raise IdempotencyConflict(422, "Idempotency-Key was already used for a different request")
+            if loop.time() >= deadline:
+                raise IdempotencyConflict(409, "A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(DB_POLL_SECONDS)
+
+    def _settle(self, key: str, response: Optional[StoredResponse]):
+        pending = self._inflight.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(response)
+
+    async def finish(self, key: str, response: Optional[StoredResponse], claimed: bool = True):
+        """response=None — запрос не удался (исключение или 5xx): ключ освобождается,
+        и повтор выполнит запрос заново. claimed=False — ключ в БД этот запрос не занимал."""
+        try:
+            if response is None:
+                if claimed:
+                    await self._db("release", key)
+            else:
+                self._remember(key, response)
+                await self._db("complete", key, response)
+        finally:
+            self._settle(key, response)
+
+        if time.monotonic() - self._pruned_at > 3600:
+            self._pruned_at = time.monotonic()
+            deleted = await self._db("prune")
+            if deleted:
+                print(f"🧹 Удалено просроченных Idempotency-Key: {deleted}")
+
+
+def _digest(*parts: bytes) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+async def fingerprint_request(scope, body: bytes) -> str:
+    """Отпечаток тела запроса. Форму браузер каждый раз кодирует заново (у
+    multipart новая граница), поэтому для форм берутся разобранные поля,
+    отсортированные по имени и значению."""
+    content_type = next((value for name, value in scope["headers"] if name == b"content-type"), b"")
+    if content_type.split(b";", 1)[0].strip().lower().decode("latin-1") not in FORM_TYPES:
+        return _digest(body)
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    try:
+        form = await Request(scope, receive).form()
+    except Exception:
+        # форму не разобрать — её отклонит и сам обработчик; отпечаток по сырому телу
+        return _digest(body)
+    try:
+        fields = []
+        for name, value in form.multi_items():
+            if isinstance(value, UploadFile):
+                value = f"{value.filename}\0{hashlib.sha256(await value.read()).hexdigest()}"
+            fields.append((name, value))
+    finally:
+        await form.close()
+    return _digest(json.dumps(sorted(fields)).encode())
+
+
+class IdempotencyMiddleware:
+    """Для POST из IDEMPOTENT_PATHS с заголовком Idempotency-Key. Ключ действует
+    в пределах сессии и пути; тот же ключ с другим телом запроса — 422."""
+
+    def __init__(self, app, store: IdempotencyStore = None, paths=None):
+        self.app = app
+        self.store = store or IdempotencyStore()
+        self.paths = set(paths or config.IDEMPOTENT_PATHS)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        raw_key = next((value for name, value in scope["headers"] if name == HEADER), None)
+        if raw_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(raw_key) <= MAX_KEY_LENGTH:
+            await send_json(send, 400, {"detail": "Invalid Idempotency-Key"})
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        session_id = parse_cookies(scope).get(config.SESSION_COOKIE_NAME, "")
+        key = _digest(session_id.encode(), scope["path"].encode(), raw_key)
+        fingerprint = await fingerprint_request(scope, body)
+
+        while True:
+            try:
+                stored = await self.store.begin(key, fingerprint)
+            except IdempotencyConflict as conflict:
+                await send_json(send, conflict.status, {"detail": conflict.detail})
+                return
+
+            if stored is not None:
+                await send({
+                    "type": "http.response.start",
+                    "status": stored.status,
+                    "headers": [*stored.headers, (b"idempotent-replayed", b"true")]
+                })
+                await send({"type": "http.response.body", "body": stored.body})
+                return
+
+            try:
+                await self._run(scope, receive, send, key, fingerprint, body)
+                return
+            except ClaimLost:
+                # ключ занял другой воркер, наша транзакция откатилась — ждём его ответа
+                continue
+
+    async def _run(self, scope, receive, send, key: str, fingerprint: str, body: bytes):
+        consumed = False
+
+        async def replay_receive():
+            nonlocal consumed
+            if not consumed:
+                consumed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        claim = PendingClaim(key, fingerprint)
+        token = _pending_claim.set(claim)
+        response = None
+        try:
+            try:
+                await self.app(scope, replay_receive, capture)
+            except ClaimLost:
+                if start:
+                    raise RuntimeError("Idempotency-Key was claimed by another worker after the response started")
+                raise
+            finally:
+                claim.closed = True
+                _pending_claim.reset(token)
+            # ответы с ошибкой сервера не сохраняются: повтор должен выполнить запрос заново
+            if start and start["status"] < 500:
+                response = StoredResponse(fingerprint, start["status"], list(start.get("headers", [])),
+                                          b"".join(chunks))
+        finally:
+            await self.store.finish(key, response, claimed=claim.recorded)
@@ -0,0 +1,58 @@
+"""Фоновые задачи, которые должны идти в одном воркере из всех.
+
+Снятие просроченных броней и чистка корзин запускаются в lifespan каждого
+воркера serve.py, но очередной проход выполняет только владелец аренды
+задачи в worker_leases. Владелец продлевает аренду на каждом проходе; если
+он упал, аренду после её истечения забирает первый воркер, который спросит."""
+import os
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, or_
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import WorkerLease
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Leases:
+    def __init__(self, db: Session, owner: str = WORKER_ID):
+        self.db = db
+        self.owner = owner
+
+    def acquire(self, name: str, ttl_seconds: float, now: datetime = None) -> bool:
+        """Берёт или продлевает аренду; False — задачу сейчас ведёт другой воркер."""
+        now = now or datetime.utcnow()
+        stmt = dialect_insert(self.db, WorkerLease).values(
+            name=name, owner=self.owner, expires_at=now + timedelta(seconds=ttl_seconds)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[WorkerLease.name],
+            set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+            where=or_(WorkerLease.owner == self.owner, WorkerLease.expires_at < now)
+        )
+        acquired = self.db.execute(stmt.returning(WorkerLease.name)).first() is not None
+        self.db.commit()
+        return acquired
+
+    def release(self, name: str):
+        self.db.execute(delete(WorkerLease).where(WorkerLease.name == name, WorkerLease.owner == self.owner))
+        self.db.commit()
+
+
+async def acquire_lease(session_factory, name: str, interval: float) -> bool:
+    """Аренда живёт два интервала задачи: один пропущенный проход владельца
+    её не теряет, а упавшего владельца сменят не позже чем через три."""
+    async with session_factory() as db:
+        return await db.run_sync(lambda session: Leases(session).acquire(name, interval * 2 + 30))
+
+
+async def release_lease(session_factory, name: str):
+    """При остановке воркера: следующий владелец не ждёт истечения аренды."""
+    try:
+        async with session_factory() as db:
+            await db.run_sync(lambda session: Leases(session).release(name))
+    except Exception as error:
+        print(f"⚠️ Не удалось освободить аренду {name}: {error}")
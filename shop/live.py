@@ -0,0 +1,136 @@
+"""Живые обновления магазина по SSE (/shop/api/live).
+
+Оформление заказа сообщает новые остатки, мутации корзины — сводку корзины
+своей сессии. Хаб копит изменения LIVE_COALESCE_MS и рассылает одной
+пачкой: сколько бы заказов ни прошло за окно, каждый подписчик получит один
+кадр "stock" с последними остатками, а сам кадр кодируется один раз на всех.
+Изменения из других воркеров приходят через cache_sync (события "stock" и
+"cart_summary")."""
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Optional, Set
+
+from config import config
+from metrics import LIVE_SUBSCRIBERS
+from shop.cache_sync import on_invalidate
+
+
+def encode_event(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class Subscriber:
+    def __init__(self, session_id: Optional[str], queue_size: int):
+        self.session_id = session_id
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def push(self, frame: bytes):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # клиент не успевает читать: копить не будем, он перечитает всё сам
+            self.overflowed = True
+
+
+class LiveHub:
+    def __init__(self, window: float = None, max_subscribers: int = None, queue_size: int = None):
+        self.window = window if window is not None else config.LIVE_COALESCE_MS / 1000
+        self.max_subscribers = max_subscribers or config.LIVE_MAX_SUBSCRIBERS
+        self.queue_size = queue_size or config.LIVE_QUEUE_SIZE
+        self._subscribers: Set[Subscriber] = set()
+        self._sessions: Dict[str, Set[Subscriber]] = {}
+        self._stock: Dict[int, int] = {}
+        # None вместо сводки — корзина изменилась в другом воркере, клиент перечитает её
+        self._carts: Dict[str, Optional[Dict]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def subscribe(self, session_id: Optional[str]) -> Optional[Subscriber]:
+        if self.full:
+            return None
+        subscriber = Subscriber(session_id, self.queue_size)
+        self._subscribers.add(subscriber)
+        if session_id:
+            self._sessions.setdefault(session_id, set()).add(subscriber)
+        LIVE_SUBSCRIBERS.inc()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber not in self._subscribers:
+            return
+        self._subscribers.discard(subscriber)
+        tabs = self._sessions.get(subscriber.session_id)
+        if tabs is not None:
+            tabs.discard(subscriber)
+            if not tabs:
+                del self._sessions[subscriber.session_id]
+        LIVE_SUBSCRIBERS.dec()
+
+    def stock_changed(self, levels: Dict[int, int]):
+        if not self._subscribers or not levels:
+            return
+        self._stock.update(levels)
+        self._schedule()
+
+    def cart_changed(self, session_id: str, summary: Optional[Dict] = None):
+        if session_id not in self._sessions:
+            return
+        self._carts[session_id] = summary
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        self._flush_handle = None
+        if self._stock:
+            frame = encode_event("stock", {str(product_id): stock for product_id, stock in self._stock.items()})
+            self._stock.clear()
+            for subscriber in self._subscribers:
+                subscriber.push(frame)
+        carts, self._carts = self._carts, {}
+        for session_id, summary in carts.items():
+            frame = encode_event("cart", summary)
+            for subscriber in self._sessions.get(session_id, ()):
+                subscriber.push(frame)
+
+    async def stream(self, session_id: Optional[str], heartbeat: float = None) -> AsyncIterator[bytes]:
+        """Тело ответа text/event-stream. Подписка живёт ровно столько, сколько
+        генератор: отписка в finally, когда клиент ушёл и поток закрыт."""
+        heartbeat = heartbeat or config.LIVE_HEARTBEAT_SECONDS
+        subscriber = self.subscribe(session_id)
+        if subscriber is None:
+            return
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # комментарий держит соединение через прокси и выявляет ушедших клиентов
+                    yield b": ping\n\n"
+                    continue
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
+                    frame = encode_event("resync", {})
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+
+live_hub = LiveHub()
+
+
+def _remote_stock(key: str):
+    live_hub.stock_changed({int(product_id): stock for product_id, stock in json.loads(key).items()})
+
+
+on_invalidate("stock", _remote_stock)
+on_invalidate("cart_summary", live_hub.cart_changed)
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+
+from config import config
+from models import Cart, CartItem
+from shop.leases import acquire_lease, release_lease
+
+last_sweep: Dict = {}
+
+
+class CartSweeper:
+    """Удаляет корзины, которые не менялись дольше SESSION_MAX_AGE
+    (cookie сессии к этому времени уже истекла)."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def sweep_batch(self, cutoff: datetime, batch_size: int) -> Tuple[int, int]:
+        # сначала пишем (DELETE ... RETURNING), чтобы транзакция сразу взяла
+        # блокировку на запись и держала её только на одну короткую пачку
+        stale = select(Cart.id).where(Cart.updated_at < cutoff).limit(batch_size).scalar_subquery()
+        cart_ids = self.db.execute(
+            delete(Cart)
+            .where(Cart.id.in_(stale), Cart.updated_at < cutoff)
+            .returning(Cart.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+
+        items = 0
+        if cart_ids:
+            items = self.db.execute(
+                delete(CartItem)
+                .where(CartItem.cart_id.in_(cart_ids))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+
+        self.db.commit()
+        return len(cart_ids), items
+
+    def compact(self) -> bool:
+        """Возвращает освободившиеся страницы и обновляет статистику планировщика."""
+        if self.db.get_bind().dialect.name != "sqlite":
+            return False
+        if self.db.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            self.db.execute(text("PRAGMA incremental_vacuum(1000)"))
+        self.db.execute(text("PRAGMA optimize"))
+        self.db.commit()
+        return True
+
+
+async def sweep_expired_carts(session_factory, batch_size: int = None, pause: float = None) -> Dict:
+    batch_size = batch_size or config.CART_SWEEP_BATCH
+    pause = config.CART_SWEEP_PAUSE_SECONDS if pause is None else pause
+    cutoff = datetime.utcnow() - timedelta(seconds=config.SESSION_MAX_AGE)
+    started = time.perf_counter()
+    carts = items = batches = 0
+
+    while True:
+        async with session_factory() as db:
+            swept_carts, swept_items = await db.run_sync(
+                lambda session: CartSweeper(session).sweep_batch(cutoff, batch_size)
+            )
+        carts += swept_carts
+        items += swept_items
+        batches += 1
+        if swept_carts < batch_size:
+            break
+        # пауза между пачками, чтобы запросы покупателей успевали взять блокировку
+        await asyncio.sleep(pause)
+
+    compacted = False
+    if config.CART_SWEEP_VACUUM and carts:
+        async with session_factory() as db:
+            compacted = await db.run_sync(lambda session: CartSweeper(session).compact())
+
+    report = {
+        "carts": carts,
+        "cart_items": items,
+        "batches": batches,
+        "compacted": compacted,
+        "seconds": round(time.perf_counter() - started, 3),
+        "finished_at": datetime.utcnow().isoformat() + "Z"
+    }
+    last_sweep.clear()
+    last_sweep.update(report)
+    return report
+
+
+async def cart_sweeper_worker(session_factory, interval: float = None):
+    """Фоновая задача из lifespan: периодически чистит просроченные корзины."""
+    interval = interval or config.CART_SWEEP_INTERVAL_SECONDS
+
+    try:
+        while True:
+            try:
+                # в нескольких воркерах чистит один: иначе они делят блокировку записи
+                if await acquire_lease(session_factory, "cart_sweeper", interval):
+                    report = await sweep_expired_carts(session_factory)
+                    if report["carts"]:
+                        print(f"🧹 Удалено корзин: {report['carts']}, позиций: {report['cart_items']} "
+                              f"за {report['seconds']}s")
+            except Exception as error:
+                print(f"⚠️ Ошибка при очистке корзин: {error}")
+            await asyncio.sleep(interval)
+    finally:
+        await release_lease(session_factory, "cart_sweeper")
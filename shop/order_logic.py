@@ -0,0 +1,146 @@
+from sqlalchemy import case, delete, insert, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import config
+from models import CartItem, Order, OrderItem, Product
+from shop.cart_logic import calculate_shipping, cart_summaries, make_summary
+from shop.catalog_cache import mark_catalog_dirty
+from shop.sales_logic import SalesRollup
+from shop.cache_sync import publish
+from shop.outbox import enqueue, notify
+from shop.live import live_hub
+from datetime import datetime
+import json
+import uuid
+from typing import Dict, List, Tuple
+
+def confirmation_text(order_number: str, name: str, lines: List[Tuple[str, int, float]], total: float) -> str:
+    rows = "\n".join(
+        f"  {product_name} x {quantity} — {price * quantity:.2f} {config.CURRENCY}"
+        for product_name, quantity, price in lines
+    )
+    return (
+        f"Hello {name},\n\n"
+        f"thank you for your order {order_number} at {config.SHOP_NAME}.\n\n"
+        f"{rows}\n\n"
+        f"Total (incl. shipping): {total:.2f} {config.CURRENCY}\n"
+    )
+
+class OrderManager:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_order(self, session_id: str, name: str, email: str, phone: str) -> Dict:
+        """Оформление заказа одной транзакцией.
+
+        Первым идёт запись (удаление корзины с RETURNING), поэтому SQLite сразу
+        берёт блокировку на запись и не упирается в апгрейд чтения до записи.
+        Остатки списываются одним UPDATE с условием stock >= quantity: если
+        хоть одной позиции не хватает, вся транзакция откатывается."""
+        lines = self.db.execute(
+            delete(CartItem)
+            .where(CartItem.cart_id == session_id)
+            .returning(CartItem.product_id, CartItem.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        # строки с неположительным количеством (их могло добавить старое
+        # добавление в корзину без проверки) подняли бы остаток и обнулили сумму
+        lines = [line for line in lines if line.quantity > 0]
+
+        if not lines:
+            self.db.rollback()
+            return {"success": False, "error": "Cart is empty"}
+
+        quantities = {line.product_id: line.quantity for line in lines}
+        wanted = case(quantities, value=Product.id)
+        products = self.db.execute(
+            update(Product)
+            .where(Product.id.in_(quantities), Product.stock >= wanted)
+            .values(stock=Product.stock - wanted)
+            .returning(Product.id, Product.name, Product.price, Product.stock)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        if len(products) != len(quantities):
+            self.db.rollback()
+            return {"success": False, "error": "Not enough stock"}
+
+        subtotal = sum(p.price * quantities[p.id] for p in products)
+        total = round(subtotal + calculate_shipping(subtotal), 2)
+        order_number = f"RST-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+        created_at = datetime.utcnow()
+
+        order_id = self.db.execute(
+            insert(Order)
+            .values(
+                order_number=order_number,
+                customer_name=name,
+                customer_email=email,
+                customer_phone=phone,
+                total_amount=total,
+                status="pending",
+                created_at=created_at
+            )
+            .returning(Order.id)
+        ).scalar_one()
+
+        self.db.execute(
+            insert(OrderItem),
+            [
+                {
+                    "order_id": order_id,
+                    "product_id": p.id,
+                    "product_name": p.name,
+                    "quantity": quantities[p.id],
+                    "price": p.price
+                }
+                for p in products
+            ]
+        )
+
+        # сводки продаж обновляются в той же транзакции, что и заказ
+        SalesRollup(self.db).record_order(
+            created_at.date(),
+            [(p.id, p.name, quantities[p.id], p.price) for p in products],
+            total
+        )
+
+        # письмо с подтверждением попадает в очередь вместе с заказом, а отправляет
+        # его фоновый воркер — медленная почта не задерживает оформление
+        enqueue(
+            self.db,
+            "order_confirmation",
+            email,
+            f"Your order {order_number}",
+            confirmation_text(order_number, name, [(p.name, quantities[p.id], p.price) for p in products], total)
+        )
+
+        stock = {p.id: p.stock for p in products}
+        mark_catalog_dirty(self.db)
+        publish(self.db, "cart_summary", session_id)
+        publish(self.db, "stock", json.dumps(stock))
+        self.db.commit()
+
+        return {
+            "success": True,
+            "order_number": order_number,
+            "order_id": order_id,
+            "total": total,
+            "stock": stock
+        }
+
+
+class AsyncOrderManager:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create_order(self, session_id: str, name: str, email: str, phone: str) -> Dict:
+        result = await self.db.run_sync(
+            lambda session: OrderManager(session).create_order(session_id, name, email, phone)
+        )
+        if result["success"]:
+            cart_summaries.put(session_id, make_summary(0, 0, 0))
+            live_hub.stock_changed(result["stock"])
+            live_hub.cart_changed(session_id, make_summary(0, 0, 0))
+            notify()
+        return result
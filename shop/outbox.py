@@ -0,0 +1,301 @@
+"""Очередь исходящих писем (transactional outbox).
+
+Обработчик запроса только вызывает enqueue() в своей транзакции — письмо
+появляется вместе с заказом или сообщением и не задерживает ответ. Фоновый
+outbox_worker забирает пачки писем, отправляет их параллельно через
+транспорт из OUTBOX_TRANSPORT и при ошибке откладывает повтор с
+экспоненциальной паузой. Доставка «как минимум один раз»: у письма
+постоянный Message-ID, по нему получатель отсеет дубль."""
+import asyncio
+import json
+import math
+import os
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from sqlalchemy import Row, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from config import config
+from metrics import OUTBOX_DELIVERIES, OUTBOX_LATENCY
+from models import OutboxMessage
+
+_wakeup = asyncio.Event()
+
+
+def enqueue(session: Session, kind: str, recipient: str, subject: str, body: str,
+            reply_to: Optional[str] = None):
+    """Коммит делает вызывающий — письмо уйдёт, только если запишется и заказ."""
+    session.execute(
+        insert(OutboxMessage).values(
+            kind=kind,
+            recipient=recipient,
+            subject=subject,
+            body=body,
+            reply_to=reply_to,
+            status="pending",
+            attempts=0,
+            next_attempt_at=datetime.utcnow()
+        )
+    )
+
+
+def notify():
+    """Будит воркер этого процесса после коммита, не дожидаясь OUTBOX_POLL_SECONDS."""
+    _wakeup.set()
+
+
+def build_email(message: Row) -> EmailMessage:
+    email = EmailMessage()
+    email["From"] = config.MAIL_FROM
+    email["To"] = message.recipient
+    email["Subject"] = message.subject
+    email["Message-ID"] = f"<outbox-{message.id}@{config.MAIL_FROM.rpartition('@')[2] or 'localhost'}>"
+    if message.reply_to:
+        email["Reply-To"] = message.reply_to
+    email.set_content(message.body)
+    return email
+
+
+class LogTransport:
+    async def send(self, email: EmailMessage):
+        print(f"✉️ {email['To']}: {email['Subject']}")
+
+
+class FileTransport:
+    """Дописывает письма JSON-строками в файл — для тестов и локальной разработки."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, email: EmailMessage):
+        record = {
+            "message_id": email["Message-ID"],
+            "from": email["From"],
+            "to": email["To"],
+            "reply_to": email["Reply-To"],
+            "subject": email["Subject"],
+            "body": email.get_content(),
+            "sent_at": datetime.utcnow().isoformat()
+        }
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def send(self, email: EmailMessage):
+        await asyncio.to_thread(self._write, email)
+
+
+class SmtpTransport:
+    def __init__(self, host: str, port: int = 25, username: str = None, password: str = None,
+                 ssl: bool = False, timeout: float = None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.ssl = ssl
+        self.timeout = timeout or config.OUTBOX_SEND_TIMEOUT_SECONDS
+
+    def _send(self, email: EmailMessage):
+        smtp_class = smtplib.SMTP_SSL if self.ssl else smtplib.SMTP
+        with smtp_class(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(email)
+
+    async def send(self, email: EmailMessage):
+        # smtplib блокирующий — отправка идёт в потоке, цикл событий свободен
+        await asyncio.to_thread(self._send, email)
+
+
+def make_transport(url: str = None):
+    url = url or config.OUTBOX_TRANSPORT
+    if not url:
+        raise ValueError("OUTBOX_TRANSPORT is not set")
+    if url == "log":
+        return LogTransport()
+    if url.startswith("file:"):
+        return FileTransport(url[len("file:"):])
+    parts = urlsplit(url)
+    if parts.scheme in ("smtp", "smtps"):
+        return SmtpTransport(
+            parts.hostname or "localhost",
+            parts.port or (465 if parts.scheme == "smtps" else 25),
+            username=unquote(parts.username) if parts.username else None,
+            password=unquote(parts.password) if parts.password else None,
+            ssl=parts.scheme == "smtps"
+        )
+    raise ValueError(f"Unknown OUTBOX_TRANSPORT: {url}")
+
+
+def retry_delay(attempts: int) -> float:
+    """30 s, 1 min, 2 min, ... не больше OUTBOX_RETRY_MAX_SECONDS, с разбросом,
+    чтобы письма после сбоя сервера не уходили повторно одной волной."""
+    delay = min(config.OUTBOX_RETRY_MAX_SECONDS, config.OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class Outbox:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def claim(self, limit: int, concurrency: int = 1, now: datetime = None) -> List[Row]:
+        """Забирает до limit писем, которым пора уходить. Письмо в статусе sending
+        арендовано до next_attempt_at: если воркер упал, не отправив его, после
+        этого срока письмо заберёт другой. Пачка уходит по concurrency писем
+        одновременно, поэтому аренда — на все ceil(limit / concurrency) раундов
+        по таймауту отправки и ещё один таймаут в запас: последнее письмо
+        медленной пачки не достанется второму воркеру, пока ждёт своей очереди."""
+        now = now or datetime.utcnow()
+        rounds = math.ceil(limit / max(1, concurrency))
+        lease = timedelta(seconds=config.OUTBOX_SEND_TIMEOUT_SECONDS * (rounds + 1))
+        due = [OutboxMessage.status.in_(("pending", "sending")), OutboxMessage.next_attempt_at <= now]
+        batch = (
+            select(OutboxMessage.id)
+            .where(*due)
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        # строки, а не ORM-объекты: после коммита и закрытия сессии они остаются читаемыми
+        messages = self.db.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(batch), *due)
+            .values(status="sending", attempts=OutboxMessage.attempts + 1, next_attempt_at=now + lease)
+            .returning(
+                OutboxMessage.id, OutboxMessage.kind, OutboxMessage.recipient, OutboxMessage.subject,
+                OutboxMessage.body, OutboxMessage.reply_to, OutboxMessage.attempts
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        self.db.commit()
+        return sorted(messages, key=lambda m: m.id)
+
+    def complete(self, sent: List[int], failed: List[Tuple[Row, str]],
+                 rejected: List[Tuple[Row, str]] = (), now: datetime = None):
+        """Итоги пачки записываются одной транзакцией. failed ждут повтора
+        (или сдаются после OUTBOX_MAX_ATTEMPTS), rejected — сразу failed."""
+        now = now or datetime.utcnow()
+        if sent:
+            self.db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_(sent))
+                .values(status="sent", sent_at=now, last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+        permanent = {message.id for message, _ in rejected}
+        for message, error in [*failed, *rejected]:
+            gave_up = message.id in permanent or message.attempts >= config.OUTBOX_MAX_ATTEMPTS
+            self.db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id == message.id)
+                .values(
+                    status="failed" if gave_up else "pending",
+                    next_attempt_at=now + timedelta(seconds=0 if gave_up else retry_delay(message.attempts)),
+                    last_error=error[:500]
+                )
+                .execution_options(synchronize_session=False)
+            )
+        self.db.commit()
+
+    def prune(self, before: datetime) -> int:
+        deleted = self.db.execute(
+            delete(OutboxMessage)
+            .where(OutboxMessage.status == "sent", OutboxMessage.sent_at < before)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.db.commit()
+        return deleted
+
+
+class OutboxSender:
+    def __init__(self, session_factory, transport=None, concurrency: int = None, batch_size: int = None):
+        self.session_factory = session_factory
+        self.transport = transport or make_transport()
+        self.batch_size = batch_size or config.OUTBOX_BATCH_SIZE
+        self.concurrency = concurrency or config.OUTBOX_CONCURRENCY
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    async def _deliver(self, message: Row) -> Tuple[str, Optional[str]]:
+        """("sent", None), ("retry", ошибка) или ("rejected", ошибка) — письмо
+        не собрать (например, перевод строки в заголовке), повтор не поможет."""
+        try:
+            email = build_email(message)
+        except ValueError as error:
+            OUTBOX_DELIVERIES.inc((message.kind, "rejected"))
+            return "rejected", f"{type(error).__name__}: {error}"
+
+        async with self._slots:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.transport.send(email), config.OUTBOX_SEND_TIMEOUT_SECONDS)
+            except Exception as error:
+                OUTBOX_DELIVERIES.inc((message.kind, "error"))
+                return "retry", f"{type(error).__name__}: {error}"
+            finally:
+                OUTBOX_LATENCY.observe((message.kind,), time.perf_counter() - started)
+            OUTBOX_DELIVERIES.inc((message.kind, "sent"))
+            return "sent", None
+
+    async def run_once(self) -> int:
+        """Одна пачка: забрать, отправить параллельно (не больше OUTBOX_CONCURRENCY
+        одновременно), записать итоги. Возвращает размер пачки."""
+        async with self.session_factory() as db:
+            messages = await db.run_sync(lambda session: Outbox(session).claim(self.batch_size, self.concurrency))
+        if not messages:
+            return 0
+
+        outcomes = await asyncio.gather(*(self._deliver(message) for message in messages))
+        sent = [m.id for m, (outcome, _) in zip(messages, outcomes) if outcome == "sent"]
+        failed = [(m, error) for m, (outcome, error) in zip(messages, outcomes) if outcome == "retry"]
+        rejected = [(m, error) for m, (outcome, error) in zip(messages, outcomes) if outcome == "rejected"]
+        for message, error in failed:
+            print(f"⚠️ Письмо {message.id} ({message.kind}) не отправлено, попытка {message.attempts}: {error}")
+        for message, error in rejected:
+            print(f"⚠️ Письмо {message.id} ({message.kind}) отклонено без повторов: {error}")
+
+        async with self.session_factory() as db:
+            await db.run_sync(lambda session: Outbox(session).complete(sent, failed, rejected))
+        return len(messages)
+
+    async def prune(self) -> int:
+        before = datetime.utcnow() - timedelta(days=config.OUTBOX_RETENTION_DAYS)
+        async with self.session_factory() as db:
+            return await db.run_sync(lambda session: Outbox(session).prune(before))
+
+
+async def outbox_worker(session_factory, transport=None, interval: float = None):
+    """Фоновая задача из lifespan. В каждом воркере serve.py своя: аренда в
+    claim() не даёт двум процессам отправить одно письмо одновременно."""
+    interval = interval or config.OUTBOX_POLL_SECONDS
+    if transport is None and not config.OUTBOX_TRANSPORT:
+        # без явного транспорта письма не помечаются отправленными, а ждут в очереди
+        print("⚠️ OUTBOX_TRANSPORT не задан: письма остаются в outbox_messages и не отправляются")
+        return
+    sender = OutboxSender(session_factory, transport)
+    pruned_at = datetime.utcnow()
+
+    while True:
+        _wakeup.clear()
+        try:
+            while await sender.run_once() == sender.batch_size:
+                pass
+            if datetime.utcnow() - pruned_at > timedelta(hours=1):
+                pruned_at = datetime.utcnow()
+                await sender.prune()
+        except Exception as error:
+            print(f"⚠️ Ошибка отправки писем: {error}")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
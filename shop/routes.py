@@ -1,15 +1,49 @@
 from fastapi import APIRouter, Request, Depends, Form, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, HTMLResponse, Response, StreamingResponse
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+import hmac
 import uuid
-from database import get_db
-from shop.cart_logic import CartManager
+from datetime import date
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+from database import get_async_db, get_async_read_db, AsyncReadSessionLocal
+from shop.cart_logic import AsyncCartManager, build_cart_details, make_summary
+from shop.order_logic import AsyncOrderManager
+from shop.contact_logic import AsyncContactManager
+from shop.live import live_hub
+from shop.catalog_cache import catalog_cache, etag_matches
+from shop.concert_logic import ConcertSearch, decode_cursor
+from shop.search_logic import ProductSearch, decode_cursor as decode_product_cursor
+from shop.ticket_logic import AsyncTicketManager
+from shop.sales_logic import SalesReports
+from shop.export_logic import FORMATS as EXPORT_FORMATS, export_filename, stream_orders
+from shop.admission import admission
 from config import config
-from models import Product
+from templating import templates
+from models import Cart, CartItem
 
 router = APIRouter(prefix="/shop", tags=["shop"])
-templates = Jinja2Templates(directory="templates")
+
+class CartOperation(BaseModel):
+    op: Literal["add", "update", "remove"]
+    product_id: Optional[int] = None
+    item_id: Optional[int] = None
+    # add: по умолчанию 1; update: обязательно, 0 и меньше удаляют позицию
+    quantity: Optional[int] = None
+
+class CartBatch(BaseModel):
+    operations: List[CartOperation] = Field(..., min_length=1)
+
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+# поля, попадающие в заголовки письма: перевод строки дописал бы свои заголовки
+SINGLE_LINE_PATTERN = r"^[^\r\n]+$"
+
+class ContactForm(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100, pattern=SINGLE_LINE_PATTERN)
+    email: str = Field(..., pattern=EMAIL_PATTERN, max_length=254)
+    subject: str = Field(..., min_length=1, max_length=50, pattern=SINGLE_LINE_PATTERN)
+    message: str = Field(..., min_length=1, max_length=5000)
 
 def get_session_id(request: Request) -> str:
     session_id = request.cookies.get(config.SESSION_COOKIE_NAME)
@@ -18,13 +52,12 @@ def get_session_id(request: Request) -> str:
     return session_id
 
 @router.get("/merchandise", response_class=HTMLResponse)
-async def merchandise_page(request: Request, db: Session = Depends(get_db)):
-    from models import Product
-    products = db.query(Product).all()
+async def merchandise_page(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    catalog = await catalog_cache.get(db)
     
     return templates.TemplateResponse(
         "merchandise.html",
-        {"request": request, "products": products}
+        {"request": request, "products": catalog.products}
     )
 
 @router.get("/cart", response_class=HTMLResponse)
@@ -36,45 +69,144 @@ async def checkout_page(request: Request):
     return templates.TemplateResponse("checkout.html", {"request": request})
 
 @router.get("/api/products")
-async def get_products(db: Session = Depends(get_db)):
+async def get_products(request: Request, db: AsyncSession = Depends(get_async_read_db)):
     """Получаем все товары"""
-    from models import Product
-    products = db.query(Product).all()
-    
-    return [
-        {
-            "id": p.id,
-            "name": p.name,
-            "category": p.category,
-            "description": p.description,
-            "price": p.price,
-            "image_url": p.image_url,
-            "stock": p.stock
-        }
-        for p in products
-    ]
+    catalog = await catalog_cache.get(db)
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+    
+    if etag_matches(request.headers.get("if-none-match"), catalog.etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
+
+@router.get("/api/products/search")
+async def search_products(
+    q: str = "",
+    category: str = "",
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Literal["relevance", "price_asc", "price_desc", "name"] = "relevance",
+    after: Optional[str] = None,
+    limit: int = 12,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Поиск товаров по FTS-индексу: фасеты по категориям и цене, страницы по курсору"""
+    if after and decode_product_cursor(after) is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return await ProductSearch(db).search(q, category, min_price, max_price, sort, after, limit)
+
+@router.get("/api/concerts")
+async def get_concerts(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    location: str = "",
+    q: str = "",
+    after: Optional[str] = None,
+    limit: int = 6,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Концерты тура с фильтрами и постраничной выдачей по курсору"""
+    if after and decode_cursor(after) is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return await ConcertSearch(db).search(date_from, date_to, location, q, after, limit)
+
+@router.get("/api/concerts/{concert_id}/tickets")
+async def get_concert_tickets_api(concert_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    return await AsyncTicketManager(db).get_tiers(concert_id)
+
+@router.post("/api/tickets/hold")
+async def hold_tickets_api(
+    request: Request,
+    concert_id: int = Form(...),
+    ticket_type: str = Form(...),
+    quantity: int = Form(1),
+    db: AsyncSession = Depends(get_async_db)
+):
+    session_id = get_session_id(request)
+    
+    result = await AsyncTicketManager(db).hold(session_id, concert_id, ticket_type, quantity)
+    
+    if not result["success"]:
+        raise HTTPException(status_code=409 if result["error"] == "Not enough tickets left" else 400,
+                            detail=result["error"])
+    
+    response = JSONResponse(result)
+    
+    if not request.cookies.get(config.SESSION_COOKIE_NAME):
+        response.set_cookie(
+            key=config.SESSION_COOKIE_NAME,
+            value=session_id,
+            httponly=True,
+            max_age=config.SESSION_MAX_AGE
+        )
+    
+    return response
+
+@router.post("/api/tickets/hold/{hold_id}/confirm")
+async def confirm_tickets_api(request: Request, hold_id: str, db: AsyncSession = Depends(get_async_db)):
+    session_id = get_session_id(request)
+    
+    result = await AsyncTicketManager(db).confirm(session_id, hold_id)
+    
+    if not result["success"]:
+        raise HTTPException(status_code=404, detail=result["error"])
+    
+    return JSONResponse(result)
+
+@router.delete("/api/tickets/hold/{hold_id}")
+async def release_tickets_api(request: Request, hold_id: str, db: AsyncSession = Depends(get_async_db)):
+    session_id = get_session_id(request)
+    
+    result = await AsyncTicketManager(db).release(session_id, hold_id)
+    
+    if not result["success"]:
+        raise HTTPException(status_code=404, detail=result["error"])
+    
+    return JSONResponse(result)
+
+@router.get("/api/queue/status")
+async def queue_status_api(request: Request):
+    """Дешёвый опрос очереди: проверка подписи и чтение одной строки счётчиков"""
+    status = await admission.queue_status(request.cookies.get(config.QUEUE_COOKIE_NAME))
+    
+    if status is None:
+        # нет действующего номера: клиент повторит запрос и получит номер от middleware
+        return JSONResponse({"admitted": True, "position": 0, "eta_seconds": 0})
+    
+    response = JSONResponse(status)
+    
+    if status["admitted"]:
+        response.set_cookie(
+            key=config.ADMISSION_COOKIE_NAME,
+            value=admission.issue_pass(),
+            httponly=True,
+            max_age=config.WAITING_ROOM_PASS_MINUTES * 60
+        )
+        response.delete_cookie(config.QUEUE_COOKIE_NAME)
+    
+    return response
 
 @router.post("/api/cart/add")
 async def add_to_cart_api(
     request: Request,
     product_id: int = Form(...),
-    quantity: int = Form(1),
-    db: Session = Depends(get_db)
+    quantity: int = Form(1, ge=1),
+    db: AsyncSession = Depends(get_async_db)
 ):
     session_id = get_session_id(request)
-    cart_manager = CartManager(db)
+    cart_manager = AsyncCartManager(db)
     
-    result = cart_manager.add_to_cart(session_id, product_id, quantity)
+    result = await cart_manager.add_to_cart(session_id, product_id, quantity)
     
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["error"])
     
-    cart_details = cart_manager.get_cart_details(session_id)
-    
     response = JSONResponse({
         "success": True,
         "message": f"{result['product_name']} added to cart",
-        "cart": cart_details
+        "cart": result["cart"]
     })
     
     if not request.cookies.get(config.SESSION_COOKIE_NAME):
@@ -88,11 +220,14 @@ async def add_to_cart_api(
     return response
 
 @router.get("/api/cart")
-async def get_cart_api(request: Request, db: Session = Depends(get_db)):
+async def get_cart_api(request: Request, db: AsyncSession = Depends(get_async_read_db)):
     session_id = get_session_id(request)
-    cart_manager = CartManager(db)
     
-    cart_details = cart_manager.get_cart_details(session_id)
+    # у нового посетителя корзины ещё нет: она появляется только при первом добавлении
+    if not request.cookies.get(config.SESSION_COOKIE_NAME):
+        cart_details = build_cart_details(session_id, [])
+    else:
+        cart_details = await AsyncCartManager(db).get_cart_details(session_id)
     
     response = JSONResponse(cart_details)
     
@@ -106,14 +241,38 @@ async def get_cart_api(request: Request, db: Session = Depends(get_db)):
     
     return response
 
+@router.get("/api/cart/summary")
+async def get_cart_summary_api(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    """Только количество и сумма — для счётчика корзины на страницах"""
+    session_id = request.cookies.get(config.SESSION_COOKIE_NAME)
+    
+    if not session_id:
+        return make_summary(0, 0, 0)
+    
+    return await AsyncCartManager(db).get_cart_summary(session_id)
+
+@router.get("/api/live")
+async def live_api(request: Request):
+    """SSE: остатки товаров (stock) и корзина этой сессии (cart) без опроса.
+    Сессию из БД не держим — поток живёт, пока открыта страница."""
+    if not config.LIVE_ENABLED:
+        raise HTTPException(status_code=404, detail="Not found")
+    if live_hub.full:
+        raise HTTPException(status_code=503, detail="Too many live connections")
+    return StreamingResponse(
+        live_hub.stream(request.cookies.get(config.SESSION_COOKIE_NAME)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.put("/api/cart/update/{item_id}")
 async def update_cart_item_api(
     request: Request,
     item_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     session_id = get_session_id(request)
-    cart_manager = CartManager(db)
+    cart_manager = AsyncCartManager(db)
     
     try:
         data = await request.json()
@@ -121,47 +280,80 @@ async def update_cart_item_api(
     except:
         quantity = 1
     
-    result = cart_manager.update_cart_item(session_id, item_id, quantity)
+    result = await cart_manager.update_cart_item(session_id, item_id, quantity)
     
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["error"])
     
-    cart_details = cart_manager.get_cart_details(session_id)
-    
     return JSONResponse({
         "success": True,
         "message": f"Item {result['action']} successfully",
-        "cart": cart_details
+        "cart": result["cart"]
     })
 
 @router.delete("/api/cart/remove/{item_id}")
 async def remove_cart_item_api(
     request: Request,
     item_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     session_id = get_session_id(request)
-    cart_manager = CartManager(db)
+    cart_manager = AsyncCartManager(db)
     
-    result = cart_manager.remove_from_cart(session_id, item_id)
+    result = await cart_manager.remove_from_cart(session_id, item_id)
     
     if not result["success"]:
         raise HTTPException(status_code=404, detail="Item not found in cart")
     
-    cart_details = cart_manager.get_cart_details(session_id)
-    
     return JSONResponse({
         "success": True,
         "message": "Item removed from cart",
-        "cart": cart_details
+        "cart": result["cart"]
     })
 
+@router.post("/api/cart/batch")
+async def cart_batch_api(request: Request, batch: CartBatch, db: AsyncSession = Depends(get_async_db)):
+    """Несколько изменений корзины за один запрос и одну транзакцию"""
+    for index, operation in enumerate(batch.operations):
+        field = "product_id" if operation.op == "add" else "item_id"
+        if getattr(operation, field) is None:
+            raise HTTPException(status_code=422, detail=f"Operation {index}: {field} is required")
+        if operation.op == "update" and operation.quantity is None:
+            raise HTTPException(status_code=422, detail=f"Operation {index}: quantity is required")
+        if operation.op == "add" and operation.quantity is not None and operation.quantity < 1:
+            raise HTTPException(status_code=422, detail=f"Operation {index}: quantity must be at least 1")
+    
+    session_id = get_session_id(request)
+    
+    result = await AsyncCartManager(db).apply_batch(
+        session_id, [operation.model_dump(exclude_none=True) for operation in batch.operations]
+    )
+    
+    if not result["success"]:
+        raise HTTPException(status_code=400, detail=result["error"])
+    
+    response = JSONResponse({
+        "success": True,
+        "results": result["results"],
+        "cart": result["cart"]
+    })
+    
+    if not request.cookies.get(config.SESSION_COOKIE_NAME):
+        response.set_cookie(
+            key=config.SESSION_COOKIE_NAME,
+            value=session_id,
+            httponly=True,
+            max_age=config.SESSION_MAX_AGE
+        )
+    
+    return response
+
 @router.delete("/api/cart/clear")
-async def clear_cart_api(request: Request, db: Session = Depends(get_db)):
+async def clear_cart_api(request: Request, db: AsyncSession = Depends(get_async_db)):
     session_id = get_session_id(request)
-    cart_manager = CartManager(db)
+    cart_manager = AsyncCartManager(db)
     
-    result = cart_manager.clear_cart(session_id)
+    result = await cart_manager.clear_cart(session_id)
     
     return JSONResponse({
         "success": True,
@@ -173,75 +365,92 @@ async def clear_cart_api(request: Request, db: Session = Depends(get_db)):
 async def create_order_api(
     request: Request,
     name: str = Form(...),
-    email: str = Form(...),
+    email: str = Form(..., pattern=EMAIL_PATTERN, max_length=254),
     phone: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    from models import Order, OrderItem
-    from datetime import datetime
-    
     session_id = get_session_id(request)
-    cart_manager = CartManager(db)
-    
-    cart_details = cart_manager.get_cart_details(session_id)
-    
-    if cart_details["item_count"] == 0:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    order_number = f"RST-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
-    
-    order = Order(
-        order_number=order_number,
-        customer_name=name,
-        customer_email=email,
-        customer_phone=phone,
-        total_amount=cart_details["total"],
-        status="pending"
-    )
-    
-    db.add(order)
-    db.commit()
-    db.refresh(order)
-    
-    for item in cart_details["items"]:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item["product_id"],
-            product_name=item["name"],
-            quantity=item["quantity"],
-            price=item["price"]
-        )
-        db.add(order_item)
-        
-        product = db.query(Product).filter(Product.id == item["product_id"]).first()
-        if product:
-            product.stock -= item["quantity"]
-            if product.stock < 0:
-                product.stock = 0
+    order_manager = AsyncOrderManager(db)
     
-    cart_manager.clear_cart(session_id)
+    result = await order_manager.create_order(session_id, name, email, phone)
     
-    db.commit()
+    if not result["success"]:
+        raise HTTPException(status_code=400, detail=result["error"])
     
     return JSONResponse({
         "success": True,
-        "order_number": order_number,
-        "order_id": order.id,
-        "total": cart_details["total"],
+        "order_number": result["order_number"],
+        "order_id": result["order_id"],
+        "total": result["total"],
         "message": "Order created successfully"
     })
 
+@router.post("/api/contact")
+async def contact_api(form: ContactForm, db: AsyncSession = Depends(get_async_db)):
+    """Сообщение сохраняется и ставится в очередь писем; ответ не ждёт отправки"""
+    manager = AsyncContactManager(db)
+    result = await manager.submit(form.name, form.email, form.subject, form.message)
+    return JSONResponse({"success": True, "message_id": result["message_id"]}, status_code=202)
+
+def require_reports_access(request: Request):
+    """Отчёты и выгрузка заказов — только с токеном из REPORTS_TOKEN.
+    Токен не задан — закрыты для всех."""
+    token = request.headers.get("x-reports-token", "")
+    if not config.REPORTS_TOKEN or not hmac.compare_digest(
+        token.encode(), config.REPORTS_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@router.get("/api/sales/daily", dependencies=[Depends(require_reports_access)])
+async def sales_daily_api(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Заказы, штуки и выручка по дням (по умолчанию — последние 30 дней)"""
+    return await SalesReports(db).daily(date_from, date_to)
+
+@router.get("/api/sales/top", dependencies=[Depends(require_reports_access)])
+async def sales_top_api(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    by: Literal["units", "revenue"] = "units",
+    limit: int = 10,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Самые продаваемые товары за период"""
+    return await SalesReports(db).top_products(date_from, date_to, by, limit)
+
+@router.get("/api/export/orders", dependencies=[Depends(require_reports_access)])
+async def export_orders_api(
+    format: Literal["csv", "ndjson"] = "csv",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[str] = None,
+    gzip: bool = False
+):
+    """Потоковая выгрузка позиций заказов для бухгалтерии"""
+    return StreamingResponse(
+        stream_orders(AsyncReadSessionLocal, format, gzip, date_from, date_to, status),
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format, gzip)}"'}
+    )
+
 @router.get("/api/debug/session")
-async def debug_session_api(request: Request, db: Session = Depends(get_db)):
+async def debug_session_api(request: Request, db: AsyncSession = Depends(get_async_read_db)):
     session_id = get_session_id(request)
     
-    from models import Cart
-    cart = db.query(Cart).filter(Cart.id == session_id).first()
+    cart = await db.get(Cart, session_id)
+    cart_items = 0
+    if cart:
+        cart_items = await db.scalar(
+            select(func.count()).select_from(CartItem).where(CartItem.cart_id == session_id)
+        )
     
     return {
         "session_id": session_id,
         "has_cookie": config.SESSION_COOKIE_NAME in request.cookies,
         "cookie_value": request.cookies.get(config.SESSION_COOKIE_NAME),
         "has_cart": cart is not None,
-        "cart_items": len(cart.items) if cart else 0
+        "cart_items": cart_items
     }
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""Сводные таблицы продаж по дням.
+
+Оформление заказа добавляет свои строки в sales_daily и product_sales_daily
+в той же транзакции, поэтому отчёты читают только сводки и не зависят от
+размера истории заказов. Пересборка из orders/order_items:
+
+    python -m shop.sales_logic rebuild                    # всё заново
+    python -m shop.sales_logic rebuild --since 2024-05-01 # с указанного дня
+"""
+import argparse
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import Order, OrderItem, ProductSalesDaily, SalesDaily
+
+MAX_TOP_LIMIT = 100
+DEFAULT_DAYS = 30
+
+
+class SalesRollup:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_order(self, day: date, lines: Iterable[Tuple[int, str, int, float]], total: float):
+        """Строки заказа (product_id, name, quantity, price) прибавляются к сводкам дня.
+        Коммит делает вызывающий — вместе с самим заказом."""
+        lines = list(lines)
+
+        stmt = dialect_insert(self.db, ProductSalesDaily)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ProductSalesDaily.day, ProductSalesDaily.product_id],
+            set_={
+                "product_name": stmt.excluded.product_name,
+                "units": ProductSalesDaily.units + stmt.excluded.units,
+                "revenue": ProductSalesDaily.revenue + stmt.excluded.revenue
+            }
+        )
+        self.db.execute(stmt, [
+            {
+                "day": day,
+                "product_id": product_id,
+                "product_name": name,
+                "units": quantity,
+                "revenue": round(price * quantity, 2)
+            }
+            for product_id, name, quantity, price in lines
+        ])
+
+        stmt = dialect_insert(self.db, SalesDaily).values(
+            day=day,
+            orders=1,
+            units=sum(quantity for _, _, quantity, _ in lines),
+            revenue=total
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SalesDaily.day],
+            set_={
+                "orders": SalesDaily.orders + 1,
+                "units": SalesDaily.units + stmt.excluded.units,
+                "revenue": SalesDaily.revenue + stmt.excluded.revenue
+            }
+        )
+        self.db.execute(stmt)
+
+    def rebuild(self, since: Optional[date] = None) -> Dict:
+        """Пересчитывает сводки из заказов (всё или начиная с since) одной транзакцией."""
+        day = func.date(Order.created_at)
+        placed = [Order.status != "cancelled"]
+        if since:
+            placed.append(Order.created_at >= datetime.combine(since, time.min))
+
+        for model in (ProductSalesDaily, SalesDaily):
+            stmt = delete(model)
+            if since:
+                stmt = stmt.where(model.day >= since)
+            self.db.execute(stmt)
+
+        products = self.db.execute(
+            insert(ProductSalesDaily).from_select(
+                ["day", "product_id", "product_name", "units", "revenue"],
+                select(
+                    day,
+                    OrderItem.product_id,
+                    func.max(OrderItem.product_name),
+                    func.sum(OrderItem.quantity),
+                    func.round(func.sum(OrderItem.price * OrderItem.quantity), 2)
+                )
+                .join(Order, Order.id == OrderItem.order_id)
+                .where(*placed)
+                .group_by(day, OrderItem.product_id)
+            )
+        ).rowcount
+
+        units = (
+            select(func.coalesce(func.sum(ProductSalesDaily.units), 0))
+            .where(ProductSalesDaily.day == day)
+            .scalar_subquery()
+        )
+        days = self.db.execute(
+            insert(SalesDaily).from_select(
+                ["day", "orders", "units", "revenue"],
+                select(day, func.count(Order.id), units, func.round(func.sum(Order.total_amount), 2))
+                .where(*placed)
+                .group_by(day)
+            )
+        ).rowcount
+
+        self.db.commit()
+        return {"days": days, "product_days": products}
+
+
+def _period(date_from: Optional[date], date_to: Optional[date]) -> Tuple[date, date]:
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_DAYS - 1)
+    return date_from, date_to
+
+
+class SalesReports:
+    """Отчёты для дашборда: читают только сводные таблицы."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def daily(self, date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict:
+        date_from, date_to = _period(date_from, date_to)
+        rows = (await self.db.execute(
+            select(SalesDaily)
+            .where(SalesDaily.day.between(date_from, date_to))
+            .order_by(SalesDaily.day)
+        )).scalars().all()
+
+        days: List[Dict] = [
+            {"day": row.day.isoformat(), "orders": row.orders, "units": row.units, "revenue": round(row.revenue, 2)}
+            for row in rows
+        ]
+        return {
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "days": days,
+            "totals": {
+                "orders": sum(d["orders"] for d in days),
+                "units": sum(d["units"] for d in days),
+                "revenue": round(sum(d["revenue"] for d in days), 2)
+            }
+        }
+
+    async def top_products(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                           by: str = "units", limit: int = 10) -> Dict:
+        date_from, date_to = _period(date_from, date_to)
+        units = func.sum(ProductSalesDaily.units).label("units")
+        revenue = func.sum(ProductSalesDaily.revenue).label("revenue")
+        rows = (await self.db.execute(
+            select(ProductSalesDaily.product_id, func.max(ProductSalesDaily.product_name).label("name"), units, revenue)
+            .where(ProductSalesDaily.day.between(date_from, date_to))
+            .group_by(ProductSalesDaily.product_id)
+            .order_by((revenue if by == "revenue" else units).desc(), ProductSalesDaily.product_id)
+            .limit(max(1, min(limit, MAX_TOP_LIMIT)))
+        )).all()
+
+        return {
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "by": by,
+            "products": [
+                {"product_id": row.product_id, "name": row.name, "units": row.units, "revenue": round(row.revenue, 2)}
+                for row in rows
+            ]
+        }
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Сводные таблицы продаж")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--since", type=date.fromisoformat, help="пересчитать начиная с дня YYYY-MM-DD")
+    args = parser.parse_args()
+
+    init_db()
+    with SessionLocal() as db:
+        result = SalesRollup(db).rebuild(args.since)
+    print(f"✅ Пересчитано дней: {result['days']}, строк по товарам: {result['product_days']}")
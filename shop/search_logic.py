@@ -0,0 +1,205 @@
+import base64
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, column, func, or_, select, table, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Product
+from shop.catalog_cache import serialize_product
+
+MAX_PAGE_SIZE = 48
+
+# внешний контент: FTS хранит только индекс, сами строки остаются в products.
+# Триггер обновления срабатывает только на name/description/category, поэтому
+# списание остатков при оформлении заказа индекс не трогает.
+SEARCH_INDEX_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description, category,
+        content='products', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description, category ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+)
+
+products_fts = table("products_fts", column("rowid"), column("rank"), column("products_fts"))
+_fts_ready: Dict[Tuple[int, str], bool] = {}
+
+
+def create_fts_index(connection, name: str, ddl, populate: str) -> bool:
+    """Создаёт FTS5-таблицу name с её триггерами (только SQLite); при первом
+    создании заполняет её запросом populate."""
+    if connection.dialect.name != "sqlite":
+        return False
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).first()
+    try:
+        for statement in ddl:
+            connection.exec_driver_sql(statement)
+    except OperationalError as error:
+        # SQLite собран без FTS5 — поиск работает через LIKE
+        print(f"⚠️ FTS5 недоступен, {name} не создан, поиск без индекса: {error}")
+        return False
+    if not exists:
+        connection.exec_driver_sql(populate)
+    return True
+
+
+def create_search_index(connection) -> bool:
+    """FTS5-индекс товаров."""
+    return create_fts_index(
+        connection, "products_fts", SEARCH_INDEX_DDL, "INSERT INTO products_fts(products_fts) VALUES ('rebuild')"
+    )
+
+
+async def fts_table_exists(db: AsyncSession, name: str) -> bool:
+    """Есть ли FTS-таблица name (только SQLite); ответ кэшируется на движок."""
+    bind = db.get_bind()
+    if bind.dialect.name != "sqlite":
+        return False
+    key = (id(bind), name)
+    if key not in _fts_ready:
+        _fts_ready[key] = await db.scalar(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+        ) is not None
+    return _fts_ready[key]
+
+
+def escape_like(value: str) -> str:
+    """Пользовательский ввод для LIKE ... ESCAPE '\\': % и _ — обычные символы."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def fts_query(q: str) -> str:
+    """Пользовательский ввод -> запрос FTS5: каждое слово как префикс, без операторов."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", q))
+
+
+def encode_cursor(value, product_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, product_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple]:
+    """None для чужого или подделанного курсора: в запрос попадают только
+    скалярное значение ключа сортировки и целый id."""
+    try:
+        value, product_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(value, (str, int, float, type(None))) or type(product_id) is not int:
+        return None
+    return value, product_id
+
+
+class ProductSearch:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def _filtered(self, stmt, matches, category: str = "", min_price: Optional[float] = None,
+                  max_price: Optional[float] = None, pattern: str = ""):
+        if matches is not None:
+            stmt = stmt.join(matches, matches.c.id == Product.id)
+        elif pattern:
+            stmt = stmt.where(or_(
+                Product.name.ilike(pattern, escape="\\"), Product.description.ilike(pattern, escape="\\")
+            ))
+        if category:
+            stmt = stmt.where(Product.category == category)
+        if min_price is not None:
+            stmt = stmt.where(Product.price >= min_price)
+        if max_price is not None:
+            stmt = stmt.where(Product.price <= max_price)
+        return stmt
+
+    async def search(self, q: str = "", category: str = "", min_price: Optional[float] = None,
+                     max_price: Optional[float] = None, sort: str = "relevance",
+                     after: Optional[str] = None, limit: int = 12) -> Dict:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        q = q.strip()
+        category = category.strip()
+
+        matches = None
+        pattern = ""
+        match = fts_query(q)
+        if match and await fts_table_exists(self.db, "products_fts"):
+            matches = (
+                select(products_fts.c.rowid.label("id"), products_fts.c.rank.label("rank"))
+                .where(products_fts.c.products_fts.op("MATCH")(match))
+                .subquery("matches")
+            )
+        elif match:
+            pattern = f"%{escape_like(q)}%"
+
+        if sort == "relevance" and matches is None:
+            sort = "default"
+        key, descending = {
+            "relevance": (matches.c.rank if matches is not None else None, False),
+            "price_asc": (Product.price, False),
+            "price_desc": (Product.price, True),
+            "name": (Product.name, False),
+            "default": (Product.id, False),
+        }[sort]
+
+        stmt = self._filtered(select(Product, key.label("sort_key")), matches, category, min_price, max_price, pattern)
+
+        if after:
+            value, last_id = decode_cursor(after)
+            beyond = key < value if descending else key > value
+            stmt = stmt.where(or_(beyond, and_(key == value, Product.id > last_id)))
+
+        rows = (await self.db.execute(
+            stmt.order_by(key.desc() if descending else key, Product.id).limit(limit + 1)
+        )).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        result = {
+            "items": [serialize_product(product) for product, _ in rows],
+            "next_cursor": encode_cursor(rows[-1].sort_key, rows[-1][0].id) if has_more else None
+        }
+
+        # счётчики и фасеты — только для первой страницы
+        if not after:
+            result["total"] = await self.db.scalar(self._filtered(
+                select(func.count(Product.id)), matches, category, min_price, max_price, pattern
+            ))
+            result["facets"] = await self._facets(matches, category, min_price, max_price, pattern)
+
+        return result
+
+    async def _facets(self, matches, category: str, min_price: Optional[float],
+                      max_price: Optional[float], pattern: str) -> Dict:
+        # у каждого фасета свой фильтр не учитывается, иначе выбранная
+        # категория скрыла бы остальные
+        categories = (await self.db.execute(
+            self._filtered(
+                select(Product.category, func.count(Product.id)), matches, "", min_price, max_price, pattern
+            ).group_by(Product.category).order_by(Product.category)
+        )).all()
+        price = (await self.db.execute(
+            self._filtered(
+                select(func.min(Product.price), func.max(Product.price)), matches, category, pattern=pattern
+            )
+        )).one()
+
+        facet_categories: List[Dict] = [{"value": value, "count": count} for value, count in categories]
+        return {
+            "categories": facet_categories,
+            "price": {"min": price[0], "max": price[1]}
+        }
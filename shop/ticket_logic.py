@@ -0,0 +1,206 @@
+import asyncio
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from models import TicketHold, TicketTier
+from shop.leases import acquire_lease, release_lease
+
+
+def serialize_tier(tier: TicketTier) -> Dict:
+    return {
+        "id": tier.id,
+        "code": tier.code,
+        "name": tier.name,
+        "price": tier.price,
+        "capacity": tier.capacity,
+        "available": max(tier.capacity - tier.sold - tier.held, 0)
+    }
+
+
+class TicketManager:
+    """Билеты по категориям концерта с временными бронями.
+
+    Свободное количество = capacity - sold - held. Бронь берётся одним
+    условным UPDATE счётчика held, поэтому её стоимость не зависит от числа
+    броней и две параллельные брони не могут продать одно место дважды.
+    Просроченные брони возвращаются пачками фоновой задачей."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_tiers(self, concert_id: int) -> Dict:
+        tiers = self.db.execute(
+            select(TicketTier).where(TicketTier.concert_id == concert_id).order_by(TicketTier.id)
+        ).scalars().all()
+        return {"concert_id": concert_id, "tiers": [serialize_tier(t) for t in tiers]}
+
+    def hold(self, session_id: str, concert_id: int, tier_code: str, quantity: int) -> Dict:
+        if quantity < 1 or quantity > config.TICKET_MAX_PER_HOLD:
+            return {"success": False, "error": f"Quantity must be between 1 and {config.TICKET_MAX_PER_HOLD}"}
+
+        tier = self.db.execute(
+            update(TicketTier)
+            .where(
+                TicketTier.concert_id == concert_id,
+                TicketTier.code == tier_code,
+                TicketTier.capacity - TicketTier.sold - TicketTier.held >= quantity
+            )
+            .values(held=TicketTier.held + quantity)
+            .returning(TicketTier.id, TicketTier.name, TicketTier.price)
+            .execution_options(synchronize_session=False)
+        ).first()
+
+        if tier is None:
+            self.db.rollback()
+            exists = self.db.scalar(
+                select(TicketTier.id).where(TicketTier.concert_id == concert_id, TicketTier.code == tier_code)
+            )
+            return {"success": False, "error": "Not enough tickets left" if exists else "Ticket type not found"}
+
+        hold_id = uuid.uuid4().hex
+        expires_at = datetime.utcnow() + timedelta(minutes=config.TICKET_HOLD_MINUTES)
+        self.db.execute(insert(TicketHold).values(
+            id=hold_id,
+            tier_id=tier.id,
+            session_id=session_id,
+            quantity=quantity,
+            status="active",
+            expires_at=expires_at,
+            created_at=datetime.utcnow()
+        ))
+        self.db.commit()
+
+        return {
+            "success": True,
+            "hold_id": hold_id,
+            "tier": tier.name,
+            "quantity": quantity,
+            "price": tier.price,
+            "total": round(tier.price * quantity, 2),
+            "expires_at": expires_at.isoformat() + "Z"
+        }
+
+    def _finish_hold(self, session_id: str, hold_id: str, status: str) -> Dict:
+        hold = self.db.execute(
+            update(TicketHold)
+            .where(
+                TicketHold.id == hold_id,
+                TicketHold.session_id == session_id,
+                TicketHold.status == "active",
+                TicketHold.expires_at > datetime.utcnow()
+            )
+            .values(status=status)
+            .returning(TicketHold.tier_id, TicketHold.quantity)
+            .execution_options(synchronize_session=False)
+        ).first()
+
+        if hold is None:
+            self.db.rollback()
+            return {"success": False, "error": "Hold not found or expired"}
+
+        values = {"held": TicketTier.held - hold.quantity}
+        if status == "confirmed":
+            values["sold"] = TicketTier.sold + hold.quantity
+        self.db.execute(
+            update(TicketTier)
+            .where(TicketTier.id == hold.tier_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+
+        return {"success": True, "hold_id": hold_id, "status": status, "quantity": hold.quantity}
+
+    def confirm(self, session_id: str, hold_id: str) -> Dict:
+        return self._finish_hold(session_id, hold_id, "confirmed")
+
+    def release(self, session_id: str, hold_id: str) -> Dict:
+        return self._finish_hold(session_id, hold_id, "released")
+
+    def expire_holds(self, batch_size: int) -> int:
+        """Одна пачка просроченных броней; возвращает число снятых броней."""
+        expired = [TicketHold.status == "active", TicketHold.expires_at <= datetime.utcnow()]
+        expired_ids = (
+            select(TicketHold.id)
+            .where(*expired)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        # условие повторяется снаружи: в READ COMMITTED (PostgreSQL) строку, которую
+        # параллельная транзакция успела подтвердить или снять, перепроверяет только
+        # внешний WHERE — иначе held у яруса уменьшился бы дважды
+        rows = self.db.execute(
+            update(TicketHold)
+            .where(TicketHold.id.in_(expired_ids), *expired)
+            .values(status="expired")
+            .returning(TicketHold.tier_id, TicketHold.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        released = Counter()
+        for row in rows:
+            released[row.tier_id] += row.quantity
+
+        for tier_id, quantity in released.items():
+            self.db.execute(
+                update(TicketTier)
+                .where(TicketTier.id == tier_id)
+                .values(held=TicketTier.held - quantity)
+                .execution_options(synchronize_session=False)
+            )
+
+        self.db.commit()
+        return len(rows)
+
+
+class AsyncTicketManager:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, method: str, *args):
+        return await self.db.run_sync(
+            lambda session: getattr(TicketManager(session), method)(*args)
+        )
+
+    async def get_tiers(self, concert_id: int) -> Dict:
+        return await self._run("get_tiers", concert_id)
+
+    async def hold(self, session_id: str, concert_id: int, tier_code: str, quantity: int) -> Dict:
+        return await self._run("hold", session_id, concert_id, tier_code, quantity)
+
+    async def confirm(self, session_id: str, hold_id: str) -> Dict:
+        return await self._run("confirm", session_id, hold_id)
+
+    async def release(self, session_id: str, hold_id: str) -> Dict:
+        return await self._run("release", session_id, hold_id)
+
+    async def expire_holds(self, batch_size: int) -> int:
+        return await self._run("expire_holds", batch_size)
+
+
+async def hold_expiry_worker(session_factory, interval: float = None, batch_size: int = None):
+    """Фоновая задача: раз в interval секунд возвращает просроченные брони в продажу."""
+    interval = interval or config.TICKET_HOLD_SWEEP_SECONDS
+    batch_size = batch_size or config.TICKET_HOLD_SWEEP_BATCH
+
+    try:
+        while True:
+            try:
+                # в нескольких воркерах брони снимает один, остальные только ждут аренды
+                while await acquire_lease(session_factory, "ticket_hold_expiry", interval):
+                    async with session_factory() as db:
+                        expired = await AsyncTicketManager(db).expire_holds(batch_size)
+                    if expired < batch_size:
+                        break
+            except Exception as error:
+                print(f"⚠️ Ошибка при снятии просроченных броней: {error}")
+            await asyncio.sleep(interval)
+    finally:
+        await release_lease(session_factory, "ticket_hold_expiry")
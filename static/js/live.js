@@ -0,0 +1,26 @@
+// Живые обновления магазина (/shop/api/live, SSE): новые остатки товаров
+// и корзина этой сессии из других вкладок. EventSource сам переподключается;
+// после переподключения вызывается resync — пропущенные события надо перечитать.
+function shopLive(handlers) {
+    if (!window.EventSource) return null;
+
+    const source = new EventSource('/shop/api/live');
+    let connected = false;
+
+    source.addEventListener('open', () => {
+        if (connected && handlers.resync) handlers.resync();
+        connected = true;
+    });
+    source.addEventListener('stock', event => {
+        if (handlers.stock) handlers.stock(JSON.parse(event.data));
+    });
+    source.addEventListener('cart', event => {
+        // null — корзина изменилась в другом воркере, сводку нужно перечитать
+        if (handlers.cart) handlers.cart(JSON.parse(event.data));
+    });
+    source.addEventListener('resync', () => {
+        if (handlers.resync) handlers.resync();
+    });
+
+    return source;
+}
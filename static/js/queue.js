@@ -0,0 +1,51 @@
+// fetch для запросов магазина, которые могут попасть в очередь или под лимит:
+// при 503 ждём своей очереди через /shop/api/queue/status, при 429 — Retry-After.
+// POST получает один Idempotency-Key на все попытки, поэтому запрос, ответ на
+// который потерялся в сети, можно безопасно повторить: сервер вернёт тот же ответ.
+async function shopFetch(url, options = {}, onWaiting = null) {
+    if ((options.method || 'GET').toUpperCase() === 'POST') {
+        const headers = new Headers(options.headers || {});
+        if (!headers.has('Idempotency-Key')) headers.set('Idempotency-Key', crypto.randomUUID());
+        options = {...options, headers};
+    }
+
+    let networkRetries = 0;
+    const send = async () => {
+        while (true) {
+            try {
+                return await fetch(url, options);
+            } catch (error) {
+                if (networkRetries >= 3) throw error;
+                networkRetries++;
+                await new Promise(resolve => setTimeout(resolve, 500 * 2 ** networkRetries));
+            }
+        }
+    };
+
+    for (let attempt = 0; attempt < 5; attempt++) {
+        const response = await send();
+
+        if (response.status === 429) {
+            const retryAfter = parseInt(response.headers.get('Retry-After')) || 1;
+            await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+            continue;
+        }
+
+        if (response.status !== 503) return response;
+
+        const data = await response.clone().json().catch(() => null);
+        if (!data || !data.queue) return response;
+
+        let status = data.queue;
+        while (!status.admitted) {
+            if (onWaiting) onWaiting(status);
+            const delay = Math.min(Math.max(status.eta_seconds, 1), 10);
+            await new Promise(resolve => setTimeout(resolve, delay * 1000));
+
+            const statusResponse = await fetch('/shop/api/queue/status');
+            status = await statusResponse.json();
+        }
+    }
+
+    return send();
+}
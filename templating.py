@@ -0,0 +1,45 @@
+"""Общее окружение Jinja для всех страниц.
+
+Скомпилированные шаблоны сохраняются на диск (FileSystemBytecodeCache), а
+precompile() при старте загружает их в память, поэтому новый воркер не
+компилирует шаблоны на первом запросе покупателя."""
+import os
+import time
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from assets import asset_url
+from config import config
+
+TEMPLATES_DIR = "templates"
+
+
+def create_templates(directory: str = TEMPLATES_DIR, cache_dir: str = None) -> Jinja2Templates:
+    cache_dir = cache_dir or config.TEMPLATE_CACHE_DIR
+    bytecode_cache = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    env = Environment(
+        loader=FileSystemLoader(directory),
+        autoescape=True,
+        bytecode_cache=bytecode_cache,
+        auto_reload=config.TEMPLATE_AUTO_RELOAD
+    )
+    env.globals["asset_url"] = asset_url
+    return Jinja2Templates(env=env)
+
+
+templates = create_templates()
+
+
+def precompile(env: Environment = None) -> dict:
+    """Загружает все .html-шаблоны в кэш окружения (и в bytecode-кэш на диске)."""
+    env = env or templates.env
+    started = time.perf_counter()
+    names = env.list_templates(filter_func=lambda name: name.endswith(".html"))
+    for name in names:
+        env.get_template(name)
+    return {"templates": len(names), "seconds": round(time.perf_counter() - started, 4)}